@@ -0,0 +1,91 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEY = 'auth:token:{}'
+TOKEN_USER_KEY = 'auth:user:{}'
+
+
+def is_cache_shared():
+    """Кэш по умолчанию общий для всех процессов: не LocMemCache
+    и не DummyCache."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя.
+    Кэш включается, только если кэш по умолчанию общий для процессов
+    (файловый, memcached): иначе сброс в одном процессе не дойдёт
+    до остальных. Пользователь хранится по ключу токена в течение
+    AUTH_TOKEN_CACHE_TIMEOUT секунд и сбрасывается при удалении токена
+    (выход), изменении пользователя (смена пароля, блокировка,
+    в том числе через update() queryset'а) и изменении его счётчиков.
+    Счётчики попаданий и промахов доступны через stats(), результат
+    для запроса пишется в request._auth_cache."""
+    _counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    _lock = threading.Lock()
+
+    def authenticate(self, request):
+        self._hit = None
+        result = super().authenticate(request)
+        if self._hit is not None:
+            request._request._auth_cache = 'hit' if self._hit else 'miss'
+        return result
+
+    def authenticate_credentials(self, key):
+        if not is_cache_shared():
+            return super().authenticate_credentials(key)
+        user = cache.get(TOKEN_KEY.format(key))
+        self._hit = user is not None
+        self.count('hits' if self._hit else 'misses')
+        if user is not None:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        cache.set_many({TOKEN_KEY.format(key): user,
+                        TOKEN_USER_KEY.format(user.pk): key},
+                       settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return user, token
+
+    @classmethod
+    def invalidate(cls, key):
+        """Сбрасывает пользователя токена после фиксации транзакции."""
+        cls.count('invalidations')
+        transaction.on_commit(lambda: cache.delete(TOKEN_KEY.format(key)))
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        """Сбрасывает закэшированного пользователя по его id."""
+        cls.invalidate_users([user_id])
+
+    @classmethod
+    def invalidate_users(cls, user_ids):
+        """Сбрасывает закэшированных пользователей user_ids
+        двумя обращениями к кэшу."""
+        user_keys = [TOKEN_USER_KEY.format(user_id) for user_id in user_ids]
+
+        def delete():
+            keys = cache.get_many(user_keys)
+            if keys:
+                cache.delete_many([*keys, *(
+                    TOKEN_KEY.format(key) for key in keys.values())])
+        cls.count('invalidations')
+        transaction.on_commit(delete)
+
+    @classmethod
+    def count(cls, counter):
+        with cls._lock:
+            cls._counters[counter] += 1
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            stats = dict(cls._counters)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 3) if total else 0
+        return stats
@@ -0,0 +1,58 @@
+import threading
+from bisect import bisect_left
+
+from .caching import get_version
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+    Хранит ингредиенты, отсортированные по названию в нижнем регистре,
+    и ищет совпадения по началу названия бинарным поиском.
+    Строится при первом обращении и сбрасывается сигналами модели
+    Ingredient, а в других процессах — при смене версии
+    области 'ingredients'."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    def invalidate(self):
+        self._index = None
+
+    def get_index(self):
+        version = get_version('ingredients')
+        index = self._index
+        if index is None or self._version != version:
+            with self._lock:
+                ingredients = sorted(
+                    Ingredient.objects.all(),
+                    key=lambda ingredient: (ingredient.name.lower(),
+                                            ingredient.id))
+                keys = [ingredient.name.lower() for ingredient in ingredients]
+                index = self._index = (keys, ingredients)
+                self._version = version
+        return index
+
+    def search(self, query, limit):
+        """Возвращает ингредиенты, название которых начинается с query,
+        а за ними — содержащие query в середине названия.
+        Регистр не учитывается, результат ограничен limit."""
+        keys, ingredients = self.get_index()
+        query = query.lower()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit and (
+                keys[end].startswith(query)):
+            end += 1
+        result = ingredients[start:end]
+        if len(result) < limit:
+            for key, ingredient in zip(keys, ingredients):
+                if query in key and not key.startswith(query):
+                    result.append(ingredient)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
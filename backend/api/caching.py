@@ -0,0 +1,104 @@
+import json
+import time
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'response-version:{}'
+RESPONSE_KEY = 'response:{}:{}:{}'
+
+
+def get_version(scope):
+    """Возвращает версию данных области 'scope'.
+    Версия — время последнего изменения данных."""
+    return cache.get_or_set(VERSION_KEY.format(scope), time.time(), None)
+
+
+def bump_version(*scopes):
+    """Обновляет версию областей после фиксации транзакции,
+    тем самым делая недействительными все сохранённые ответы."""
+    def bump():
+        now = time.time()
+        cache.set_many(
+            {VERSION_KEY.format(scope): now for scope in scopes}, None)
+    transaction.on_commit(bump)
+
+
+def merge_volatile_data(data, volatile):
+    for key, value in volatile.items():
+        if isinstance(value, dict):
+            merge_volatile_data(data[key], value)
+        else:
+            data[key] = value
+
+
+class CachedResponseMixin:
+    """Кэширует данные ответов list и retrieve в кэше Django.
+    Ключ включает версию области cache_scope и полный путь запроса.
+    Отдаёт ETag и Last-Modified и отвечает 304 на условные запросы.
+    Метод use_response_cache позволяет отключить кэш для запроса.
+    Часто меняющиеся поля (счётчики) возвращает get_volatile_data:
+    они не меняют версию области, а подставляются в кэшированные
+    данные при каждом запросе и входят в ETag."""
+    cache_scope = None
+
+    def use_response_cache(self, request):
+        return True
+
+    def get_volatile_data(self, request, *args, **kwargs):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def get_cached_response(self, request, view, *args, **kwargs):
+        if not self.use_response_cache(request):
+            return view(request, *args, **kwargs)
+        version = get_version(self.cache_scope)
+        path = md5(request.get_full_path().encode()).hexdigest()
+        volatile = self.get_volatile_data(request, *args, **kwargs)
+        etag = f'{self.cache_scope}-{version!r}-{path}'
+        if volatile is not None:
+            etag += '-' + md5(json.dumps(
+                volatile, sort_keys=True).encode()).hexdigest()
+        etag = f'"{etag}"'
+        if self.is_not_modified(request, etag,
+                                None if volatile is not None else version):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = RESPONSE_KEY.format(self.cache_scope, version, path)
+            data = cache.get(key)
+            if data is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data)
+            else:
+                if volatile is not None:
+                    merge_volatile_data(data, volatile)
+                response = Response(data)
+        response['ETag'] = etag
+        if volatile is None:
+            response['Last-Modified'] = http_date(version)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    @staticmethod
+    def is_not_modified(request, etag, version):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in (tag.strip() for tag in if_none_match.split(','))
+        if_modified_since = parse_http_date_safe(
+            request.headers.get('If-Modified-Since', ''))
+        return (version is not None and if_modified_since is not None
+                and int(version) <= if_modified_since)
@@ -0,0 +1,126 @@
+import csv
+import threading
+from abc import ABC, abstractmethod
+from copy import deepcopy
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from fpdf import FPDF
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку."""
+    def write(self, value):
+        return value
+
+
+class BaseExporter(ABC):
+    """Базовый класс выгрузки списка покупок.
+    Принимает итератор строк с полями 'ingredient__name',
+    'ingredient__measurement_unit' и 'amount'."""
+    title = 'Список покупок:'
+    filename = 'shopping_list'
+    extension = None
+    content_type = None
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @abstractmethod
+    def get_response(self):
+        """Возвращает HTTP-ответ с файлом."""
+
+    def set_filename(self, response):
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.filename}.{self.extension}"')
+        return response
+
+
+class TextExporter(BaseExporter):
+    """Построчно выгружает список покупок в текстовый файл."""
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def get_lines(self):
+        yield f'{self.title}\n\n'
+        for row in self.rows:
+            yield (f'{row["ingredient__name"]} — {row["amount"]} '
+                   f'{row["ingredient__measurement_unit"]}\n')
+
+    def get_response(self):
+        return self.set_filename(StreamingHttpResponse(
+            self.get_lines(), content_type=self.content_type))
+
+
+class CSVExporter(BaseExporter):
+    """Построчно выгружает список покупок в CSV."""
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    header = ('Ингредиент', 'Количество', 'Единица измерения')
+
+    def get_lines(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.header)
+        for row in self.rows:
+            yield writer.writerow((row['ingredient__name'], row['amount'],
+                                   row['ingredient__measurement_unit']))
+
+    def get_response(self):
+        return self.set_filename(StreamingHttpResponse(
+            self.get_lines(), content_type=self.content_type))
+
+
+class PDFExporter(BaseExporter):
+    """Выгружает список покупок в PDF.
+    Шрифт с кириллицей задаётся настройкой SHOPPING_LIST_FONT.
+    fpdf2 разбирает файл шрифта в add_font, поэтому шрифт загружается
+    один раз на процесс, а каждый документ получает его копию
+    со своим набором использованных символов."""
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    font_family = 'ShoppingList'
+    _font = None
+    _font_lock = threading.Lock()
+
+    @classmethod
+    def get_font(cls):
+        """Возвращает описание шрифта и его файла из fpdf2."""
+        if cls._font is None:
+            with cls._font_lock:
+                if cls._font is None:
+                    pdf = FPDF()
+                    pdf.add_font(cls.font_family,
+                                 fname=settings.SHOPPING_LIST_FONT)
+                    key = cls.font_family.lower()
+                    cls._font = (pdf.fonts[key], pdf.font_files[key])
+        return cls._font
+
+    def add_font(self, pdf):
+        font, font_file = self.get_font()
+        pdf.fonts[font['fontkey']] = {
+            **font, 'i': len(pdf.fonts) + 1,
+            'subset': deepcopy(font['subset'])}
+        pdf.font_files[font['fontkey']] = font_file
+
+    def render(self):
+        pdf = FPDF()
+        self.add_font(pdf)
+        pdf.add_page()
+        pdf.set_font(self.font_family, size=16)
+        pdf.cell(0, 10, self.title, new_x='LMARGIN', new_y='NEXT')
+        pdf.set_font(self.font_family, size=12)
+        for row in self.rows:
+            pdf.cell(0, 8, (f'{row["ingredient__name"]} — {row["amount"]} '
+                            f'{row["ingredient__measurement_unit"]}'),
+                     new_x='LMARGIN', new_y='NEXT')
+        return bytes(pdf.output())
+
+    def get_response(self):
+        return self.set_filename(HttpResponse(
+            self.render(), content_type=self.content_type))
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CSVExporter, PDFExporter)
+}
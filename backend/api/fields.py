@@ -0,0 +1,60 @@
+from io import BytesIO
+
+from django.conf import settings
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение в base64 с ограничением размера файла
+    и количества пикселей. Проверки выполняются до полного
+    декодирования изображения."""
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {size} МБ.',
+        'too_many_pixels': 'Изображение слишком большое: {width}x{height}.',
+    }
+
+    def to_internal_value(self, data):
+        max_size = settings.RECIPE_IMAGE['MAX_UPLOAD_SIZE']
+        if isinstance(data, str) and len(data) * 3 // 4 > max_size:
+            self.fail('too_large', size=max_size // (1024 * 1024))
+        return super().to_internal_value(data)
+
+    def get_file_extension(self, filename, decoded_file):
+        max_size = settings.RECIPE_IMAGE['MAX_UPLOAD_SIZE']
+        if len(decoded_file) > max_size:
+            self.fail('too_large', size=max_size // (1024 * 1024))
+        try:
+            with Image.open(BytesIO(decoded_file)) as image:
+                width, height = image.size
+        except Exception:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if width * height > settings.RECIPE_IMAGE['MAX_PIXELS']:
+            self.fail('too_many_pixels', width=width, height=height)
+        return super().get_file_extension(filename, decoded_file)
+
+
+class ImageVariantField(serializers.Field):
+    """Ссылка на вариант изображения рецепта. Вариант задаётся
+    в контексте ('image_variant'), пока он не построен,
+    отдаётся исходное изображение."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        name = self.context.get('image_variant', 'thumbnail')
+        image = recipe.image
+        for variant in recipe.image_variants.all():
+            if variant.name == name:
+                image = variant.image
+                break
+        if not image:
+            return None
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(image.url)
+        return image.url
@@ -1,29 +1,120 @@
+from django import forms
+from django.conf import settings
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Value,
+                              When)
+from django.db.models.functions import Lower
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe
+from .tags import tag_slugs
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.search import search_recipes
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список чисел через запятую."""
+
+
+class SlugsField(forms.MultipleChoiceField):
+    """Список слагов без проверки по списку вариантов."""
+
+    def valid_value(self, value):
+        return True
+
+
+class TagsFilter(filters.MultipleChoiceFilter):
+    """Рецепты хотя бы с одним из тегов по слагам.
+    Слаги переводятся в id без запроса к базе, а условие проверяется
+    подзапросом EXISTS к связям рецептов и тегов, поэтому рецепт
+    с несколькими подходящими тегами не повторяется в выдаче."""
+    field_class = SlugsField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = tag_slugs.get_ids(value)
+        if not tag_ids:
+            return qs.none()
+        return qs.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=tag_ids)))
+
+
+class StableOrderingFilter(filters.OrderingFilter):
+    """Сортировка с id в конце, чтобы порядок страниц
+    не зависел от одинаковых значений. Поле, заданное со знаком '-'
+    (('-favorites_count', 'popular')), сортируется только по убыванию."""
+
+    def build_choices(self, fields, labels):
+        descending = {param for field, param in fields.items()
+                      if field.startswith('-')}
+        return [(value, label) for value, label
+                in super().build_choices(fields, labels)
+                if not (value.startswith('-') and value[1:] in descending)]
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        direction = '-' if ordering[0].startswith('-') else ''
+        return qs.order_by(*ordering, f'{direction}id')
 
 
 class IngredientFilter(FilterSet):
     """Фильтр для игредиентов.
-    Фильтрует ингредиенты в произвольном месте."""
-    name = filters.CharFilter(lookup_expr='startswith')
+    Ищет ингредиенты по вхождению в название без учёта регистра:
+    сначала совпадения с начала названия, затем остальные.
+    В PostgreSQL поиск обслуживает триграммный индекс по lower(name)."""
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_name(self, queryset, name, value):
+        value = value.lower()
+        return queryset.annotate(name_lower=Lower('name')).filter(
+            name_lower__contains=value,
+        ).annotate(
+            is_substring=Case(When(name_lower__startswith=value,
+                                   then=Value(0)),
+                              default=Value(1), output_field=IntegerField())
+        ).order_by('is_substring', 'name_lower', 'id')[
+            :settings.INGREDIENT_AUTOCOMPLETE['LIMIT']]
+
 
 class RecipeFilter(FilterSet):
     """Фильтр для рецепта.
     Фильтрует рецепты по тегам, автору,
-    наличию в избранном и в списке покупок."""
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    наличию в избранном и в списке покупок.
+    Ищет рецепты по тексту через параметр 'search'.
+    Оставляет рецепты, содержащие все ингредиенты из 'ingredients'
+    и не содержащие ни одного из 'exclude_ingredients'."""
+    tags = TagsFilter()
+    search = filters.CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    exclude_ingredients = NumberInFilter(method='filter_exclude_ingredients')
     is_favorited = filters.BooleanFilter(method='get_favorite')
     is_in_shopping_cart = filters.BooleanFilter(method='get_shopping_cart')
+    ordering = StableOrderingFilter(
+        fields=(('-favorites_count', 'popular'), ('pub_date', 'pub_date')))
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author')
+        fields = ('author',)
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, описанию
+        и ингредиентам с сортировкой по релевантности."""
+        return search_recipes(queryset, value)
+
+    def filter_ingredients(self, queryset, name, value):
+        for ingredient_id in set(value):
+            queryset = queryset.filter(Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient=ingredient_id)))
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        return queryset.exclude(Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__in=value)))
 
     def get_queryset(self, queryset, name, value, key):
         user = self.request.user
@@ -0,0 +1,92 @@
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+MEMBERSHIP_KEY = 'membership:{}:{}'
+MEMBERSHIP_TIMEOUT = 60 * 5
+
+
+class UserMemberships:
+    """Связи пользователя в виде множеств id: рецепты в избранном
+    и в списке покупок, авторы в подписках.
+    Множества загружаются по одному запросу при первом обращении,
+    хранятся в общем кэше и сбрасываются при изменении связей.
+    Счётчики попаданий и промахов общего кэша доступны через stats(),
+    для запроса — в атрибутах hits и misses."""
+    relations = {
+        'favorites': (Favorite, 'recipe'),
+        'shopping_cart': (ShoppingCart, 'recipe'),
+        'subscriptions': (Subscription, 'author'),
+    }
+    _counters = {'hits': 0, 'misses': 0}
+    _lock = threading.Lock()
+
+    def __init__(self, user):
+        self.user = user
+        self._sets = {}
+        self.hits = self.misses = 0
+
+    def get(self, relation):
+        if relation in self._sets:
+            return self._sets[relation]
+        if self.user.is_anonymous:
+            return frozenset()
+        key = MEMBERSHIP_KEY.format(relation, self.user.id)
+        ids = cache.get(key)
+        if ids is not None:
+            self.hits += 1
+            self.count('hits')
+        else:
+            self.misses += 1
+            self.count('misses')
+        if ids is None:
+            model, field = self.relations[relation]
+            ids = frozenset(model.objects.filter(
+                user=self.user).values_list(field, flat=True))
+            cache.set(key, ids, MEMBERSHIP_TIMEOUT)
+        self._sets[relation] = ids
+        return ids
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.get('favorites')
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.get('shopping_cart')
+
+    def is_subscribed(self, author_id):
+        return author_id in self.get('subscriptions')
+
+    @classmethod
+    def invalidate(cls, relation, user_id):
+        """Сбрасывает множество пользователя после фиксации транзакции."""
+        transaction.on_commit(
+            lambda: cache.delete(MEMBERSHIP_KEY.format(relation, user_id)))
+
+    @classmethod
+    def count(cls, counter):
+        with cls._lock:
+            cls._counters[counter] += 1
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            stats = dict(cls._counters)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 3) if total else 0
+        return stats
+
+
+def get_memberships(request):
+    """Возвращает связи текущего пользователя,
+    загружая их не больше одного раза за запрос.
+    Связи хранятся в HttpRequest, где их видит PerformanceMiddleware."""
+    http_request = getattr(request, '_request', request)
+    memberships = getattr(http_request, '_memberships', None)
+    if memberships is None or memberships.user != request.user:
+        memberships = http_request._memberships = UserMemberships(
+            request.user)
+    return memberships
@@ -1,7 +1,132 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """Оценивает число строк по плану запроса PostgreSQL.
+    На других базах данных и при ошибке выполняет обычный COUNT."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    try:
+        with transaction.atomic(using=queryset.db), \
+                connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    except (DatabaseError, LookupError, TypeError, ValueError):
+        return queryset.count()
 
 
 class CustomLimitPaginator(PageNumberPagination):
     """Пагинатор установливает размер страницы
-    через параметр запроса 'limit'."""
+    через параметр запроса 'limit'.
+    В подклассах с cursor_fields параметр 'cursor' включает выборку
+    страниц по ключу cursor_fields (по убыванию) без OFFSET. Курсор
+    нельзя сочетать с другой сортировкой (поиск, 'ordering').
+    Общее количество в этом режиме не считается, если не передан
+    параметр 'count=exact' или 'count=estimate'."""
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_fields = None
+    invalid_cursor_message = 'Неверный курсор.'
+    ordering_conflict_message = 'Курсор нельзя сочетать с другой сортировкой.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if self.cursor_fields:
+            self.cursor = request.query_params.get(self.cursor_query_param)
+        if self.cursor is None:
+            return super().paginate_queryset(queryset, request, view)
+        ordering = tuple(f'-{field}' for field in self.cursor_fields)
+        if queryset.query.order_by and (
+                tuple(queryset.query.order_by) != ordering):
+            raise ValidationError(
+                {self.cursor_query_param: self.ordering_conflict_message})
+        self.request = request
+        page_size = self.get_page_size(request)
+        count_mode = request.query_params.get(self.count_query_param)
+        self.count = None
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'estimate':
+            self.count = estimate_count(queryset)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            queryset = queryset.filter(self.get_keyset_filter(
+                self.decode_cursor(queryset.model, self.cursor)))
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = self.encode_cursor(page[-1])
+        return page
+
+    def get_paginated_response(self, data):
+        if self.cursor is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_cursor_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_position)
+
+    def get_keyset_filter(self, values):
+        """Условие «строка идёт после курсора» при сортировке
+        по убыванию cursor_fields."""
+        condition = Q()
+        for index, field in enumerate(self.cursor_fields):
+            condition |= Q(
+                **{key: values[key] for key in self.cursor_fields[:index]},
+                **{f'{field}__lt': values[field]})
+        return condition
+
+    def encode_cursor(self, instance):
+        values = [instance._meta.get_field(field).value_to_string(instance)
+                  for field in self.cursor_fields]
+        return urlsafe_b64encode(
+            json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, model, cursor):
+        try:
+            values = json.loads(urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4)))
+            if len(values) != len(self.cursor_fields):
+                raise ValueError
+            return {
+                field: model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.cursor_fields, values)}
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class RecipePaginator(CustomLimitPaginator):
+    """Пагинатор рецептов: курсор по дате публикации."""
+    cursor_fields = ('pub_date', 'id')
+
+
+class SubscriptionPaginator(CustomLimitPaginator):
+    """Пагинатор подписок: курсор по дате подписки."""
+    cursor_fields = ('created', 'id')
@@ -1,12 +1,17 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import (SetPasswordSerializer, UserCreateSerializer,
                                 UserSerializer)
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from .validators import (validate_recipe,
+from .fields import ImageVariantField, RecipeImageField
+from .memberships import get_memberships
+from .services import ShoppingListService
+from .validators import (format_ids, validate_recipe,
                          MIN_VALUE_VALIDATOR, MAX_VALUE_VALIDATOR)
+from recipes.images import schedule_image_processing
 from recipes.models import (Favorite, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
 from users.models import Subscription
@@ -15,21 +20,24 @@ from users.models import Subscription
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    """Возвращает значение параметра 'recipes_limit' или None."""
+    limit = request.query_params.get('recipes_limit', '')
+    return int(limit) if limit.isdigit() else None
+
+
 class UserReadSerializer(UserSerializer):
     """Базовый сериализатор для кастомной модели User"""
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ('email', 'id', 'username',
-                  'first_name', 'last_name', 'is_subscribed')
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes_count', 'followers_count')
 
     def get_is_subscribed(self, obj):
         """Проверяет подписку"""
-        current_user = self.context['request'].user
-        if current_user.is_authenticated:
-            return obj.following.filter(user=current_user).exists()
-        return False
+        return get_memberships(self.context['request']).is_subscribed(obj.id)
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -94,36 +102,40 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                                              many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField(required=True)
+    image = ImageVariantField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
-                  'is_favorited', 'is_in_shopping_cart',
+                  'is_favorited', 'is_in_shopping_cart', 'favorites_count',
                   'name', 'image', 'text', 'cooking_time')
 
-    def get_is_model(self, model, obj):
-        """Проверяет, связан ли рецепт с моделью
-        для текущего пользователя."""
-        request = self.context['request']
-        if request.user.is_authenticated:
-            return model.objects.filter(
-                user=request.user, recipe=obj).exists()
-        return False
-
     def get_is_favorited(self, obj):
         """Проверяет, добавлен ли рецепт в избранное."""
-        return self.get_is_model(Favorite, obj)
+        return get_memberships(self.context['request']).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
         """Проверяет, добавлен ли рецепт в список покупок."""
-        return self.get_is_model(ShoppingCart, obj)
+        return get_memberships(
+            self.context['request']).is_in_shopping_cart(obj.id)
+
+
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """Рецепт с долей ингредиентов, которые есть у пользователя."""
+    coverage = serializers.FloatField(read_only=True)
+    matched_count = serializers.IntegerField(read_only=True)
+    ingredients_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'coverage', 'matched_count', 'ingredients_count')
 
 
 class CreateIngredientsSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания ингредиентов рецепта."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source='ingredient')
+    """Сериализатор для создания ингредиентов рецепта.
+    Существование ингредиентов проверяется сразу для всего рецепта
+    в RecipeCreateUpdateSerializer.validate."""
+    id = serializers.IntegerField(min_value=1, source='ingredient')
     amount = serializers.IntegerField(min_value=MIN_VALUE_VALIDATOR,
                                       max_value=MAX_VALUE_VALIDATOR)
 
@@ -135,9 +147,8 @@ class CreateIngredientsSerializer(serializers.ModelSerializer):
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и редактирования рецепта."""
     ingredients = CreateIngredientsSerializer(source='recipes', many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all())
-    image = Base64ImageField(required=True)
+    tags = serializers.ListField(child=serializers.IntegerField(min_value=1))
+    image = RecipeImageField(required=True)
     cooking_time = serializers.IntegerField(min_value=MIN_VALUE_VALIDATOR,
                                             max_value=MAX_VALUE_VALIDATOR)
 
@@ -146,18 +157,74 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         fields = ('ingredients', 'tags', 'image',
                   'name', 'text', 'cooking_time')
 
+    def validate(self, data):
+        """Проверяет рецепт и заменяет id ингредиентов и тегов
+        объектами: по одному запросу in_bulk на ингредиенты и теги,
+        все несуществующие id попадают в одну ошибку."""
+        ingredients_data, tags_data = validate_recipe(data)
+        ingredients = Ingredient.objects.in_bulk(
+            [ingredient['ingredient'] for ingredient in ingredients_data])
+        tags = Tag.objects.in_bulk(tags_data)
+        errors = []
+        missing = [ingredient['ingredient'] for ingredient in ingredients_data
+                   if ingredient['ingredient'] not in ingredients]
+        if missing:
+            errors.append(f'Ингредиенты не найдены: {format_ids(missing)}.')
+        missing = [pk for pk in tags_data if pk not in tags]
+        if missing:
+            errors.append(f'Теги не найдены: {format_ids(missing)}.')
+        if errors:
+            raise serializers.ValidationError(errors)
+        for ingredient in ingredients_data:
+            ingredient['ingredient'] = ingredients[ingredient['ingredient']]
+        data['recipes'] = ingredients_data
+        data['tags'] = [tags[pk] for pk in tags_data]
+        return data
+
+    @staticmethod
+    def set_ingredients(recipe, ingredients_data, existing=()):
+        """Приводит ингредиенты рецепта к переданному списку.
+        Меняет только отличающиеся строки: новые создаются одним
+        bulk_create, изменённые обновляются одним bulk_update,
+        лишние удаляются одним запросом."""
+        current, stale = {}, []
+        for item in existing:
+            if item.ingredient_id in current:
+                stale.append(item.id)
+            else:
+                current[item.ingredient_id] = item
+        to_create, to_update = [], []
+        for ingredient_data in ingredients_data:
+            ingredient = ingredient_data['ingredient']
+            amount = ingredient_data['amount']
+            item = current.pop(ingredient.id, None)
+            if item is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=amount))
+            elif item.amount != amount:
+                item.amount = amount
+                to_update.append(item)
+        stale.extend(item.id for item in current.values())
+        if stale:
+            RecipeIngredient.objects.filter(id__in=stale).delete()
+        RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        RecipeIngredient.objects.bulk_create(to_create)
+
+    @transaction.atomic
     def create(self, validated_data):
-        ingredients_data, tags_data = validate_recipe(validated_data)
+        ingredients_data = validated_data.pop('recipes')
+        tags_data = validated_data.pop('tags')
         validated_data['author'] = self.context['request'].user
         recipe = Recipe.objects.create(**validated_data)
-        for ingredient_data in ingredients_data:
-            RecipeIngredient.objects.create(recipe=recipe, **ingredient_data)
-        for tag_data in tags_data:
-            recipe.tags.add(tag_data)
+        self.set_ingredients(recipe, ingredients_data)
+        recipe.tags.set(tags_data)
+        schedule_image_processing(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data, tags_data = validate_recipe(validated_data)
+        ingredients_data = validated_data.pop('recipes')
+        tags_data = validated_data.pop('tags')
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
@@ -166,23 +233,33 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.recipes.all().delete()
-        for ingredient_data in ingredients_data:
-            RecipeIngredient.objects.create(recipe=instance, **ingredient_data)
-        instance.tags.clear()
-        for tag_data in tags_data:
-            instance.tags.add(tag_data)
+        existing = list(instance.recipes.all())
+        old_amounts = {}
+        for item in existing:
+            old_amounts[item.ingredient_id] = (
+                old_amounts.get(item.ingredient_id, 0) + item.amount)
+        self.set_ingredients(instance, ingredients_data, existing)
+        ShoppingListService.change_recipe(instance, old_amounts, {
+            ingredient_data['ingredient'].id: ingredient_data['amount']
+            for ingredient_data in ingredients_data})
+        instance.tags.set(tags_data)
         instance.save()
+        if 'image' in validated_data:
+            schedule_image_processing(instance)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', 'image_variants',
+            Prefetch('recipes', queryset=RecipeIngredient.objects
+                     .select_related('ingredient')))
         serializer = RecipeReadSerializer(instance, context=self.context)
         return serializer.data
 
 
 class BaseRecipeSerializer(serializers.ModelSerializer):
     """Сериализует основную информацию о рецепте."""
-    image = Base64ImageField()
+    image = ImageVariantField()
 
     class Meta:
         model = Recipe
@@ -199,7 +276,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='author.recipes.count')
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -208,38 +285,37 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
-        """Проверяет подписку"""
-        current_user = self.context['request'].user
-        is_user_subscribed = obj.author.follower.filter(
-            user=current_user).exists()
-        return is_user_subscribed
+        """Подписка сериализуется для её владельца,
+        поэтому он всегда подписан на автора."""
+        return True
 
     def get_recipes(self, obj):
         """Возвращает список рецептов автора.
-        Количество рецептов может быть ограничено параметром 'recipes_limit'"""
-        request = self.context['request']
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.author.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        Количество рецептов может быть ограничено параметром 'recipes_limit'.
+        Использует рецепты, загруженные заранее в 'limited_recipes'."""
+        if hasattr(obj.author, 'limited_recipes'):
+            recipes = obj.author.limited_recipes
+        else:
+            recipes = obj.author.recipes.prefetch_related('image_variants')
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = BaseRecipeSerializer(
             recipes, many=True, read_only=True)
         return serializer.data
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для массового добавления и удаления связей."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=settings.BULK_RELATIONS_LIMIT)
+
+
 class RecipeRelatedModelSerializer(serializers.ModelSerializer):
     """Cериализатор для моделей, связанных с рецептами
     (Избранное и Список покупок).
-    Проверяет, добавлен ли рецепт пользователем."""
-
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
-        if self.Meta.model.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError('Повторно нельзя добавить')
-        recipe = get_object_or_404(
-            Recipe.objects.select_related('author'), pk=recipe.id)
-        return data
+    Повторное добавление отсекает ограничение уникальности модели."""
 
     def to_representation(self, instance):
         request = self.context.get('request')
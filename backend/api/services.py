@@ -1,65 +1,374 @@
+from contextlib import contextmanager
+
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import (Case, Count, ExpressionWrapper, F, FloatField,
+                              Q, Sum, Value, When)
+from django.db.models.functions import Greatest
 from rest_framework import status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 
-from recipes.models import Recipe, ShoppingCart
+from .authentication import CachedTokenAuthentication
+from .exporters import EXPORTERS
+from .memberships import UserMemberships
+from recipes.counters import change_counters, defer_relation_signals
+from recipes.models import (Favorite, Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem)
+from users.models import Subscription
+
+User = get_user_model()
 
-User = get_user_model
+
+def get_recipe_amounts(*recipes):
+    """Возвращает ингредиенты рецептов в виде
+    {id ингредиента: количество}."""
+    return dict(RecipeIngredient.objects.filter(recipe__in=recipes).values(
+        'ingredient').annotate(total=Sum('amount')).values_list(
+        'ingredient', 'total').order_by())
 
 
 class RecipeService:
     """Сервис для работы с рецептами.
     Принимает класс сериализатора,
     добавляет или удаляет рецепт из
-    Избранного и Списка покупок."""
+    Избранного и Списка покупок.
+    Повторное добавление отсекает ограничение уникальности,
+    отсутствие связи при удалении - число удалённых строк."""
 
     def add_delete(serializer_class, request, pk):
 
         user = request.user
+        model = serializer_class.Meta.model
+        is_shopping_cart = model is ShoppingCart
+        pk = int(pk) if str(pk).isdigit() else None
         if request.method == 'POST':
-            serializer = serializer_class(data={'user': user.id, 'recipe': pk})
-            if not serializer.is_valid():
+            recipe = Recipe.objects.filter(pk=pk).prefetch_related(
+                'image_variants').first()
+            if recipe is None:
+                raise ValidationError('Ошибка валидации')
+            try:
+                with transaction.atomic():
+                    instance = model.objects.create(user=user, recipe=recipe)
+                    if is_shopping_cart:
+                        ShoppingListService(user).add_recipe(recipe)
+            except IntegrityError:
                 raise ValidationError('Ошибка валидации')
-            serializer.save()
+            serializer = serializer_class(instance)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        recipe = get_object_or_404(Recipe, pk=pk)
-        instance = serializer_class.Meta.model.objects.filter(
-            user=user, recipe=recipe)
-        if not instance.exists():
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(user=user, recipe=pk).delete()
+            if deleted and is_shopping_cart:
+                ShoppingListService(user).remove_recipe(pk)
+        if not deleted:
+            if not Recipe.objects.filter(pk=pk).exists():
+                raise NotFound
             raise ValidationError('Рецепт не был добавлен')
-        serializer = serializer_class(instance.first())
-        instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class BulkRelationService:
+    """Массовое добавление и удаление связей пользователя:
+    избранного, списка покупок и подписок. Все изменения выполняются
+    в одной транзакции. Счётчики, кэши и список покупок обновляются
+    здесь же одним запросом на каждый, независимо от числа id,
+    а не обработчиками сигналов для каждой связи."""
+    relations = {
+        Favorite: ('recipe', 'favorites'),
+        ShoppingCart: ('recipe', 'shopping_cart'),
+        Subscription: ('author', 'subscriptions'),
+    }
+
+    def __init__(self, user, model):
+        self.user = user
+        self.model = model
+        self.field, self.membership = self.relations[model]
+        self.target_model = model._meta.get_field(
+            self.field).remote_field.model
+
+    def get_found(self, ids):
+        return set(self.target_model.objects.filter(
+            pk__in=ids).values_list('pk', flat=True))
+
+    def get_relations(self, ids):
+        return self.model.objects.filter(
+            user=self.user, **{f'{self.field}__in': ids})
+
+    def get_existing(self, ids):
+        return set(self.get_relations(ids).values_list(self.field, flat=True))
+
+    def insert_relations(self, ids):
+        """Создаёт связи, пропуская уже существующие, и возвращает
+        id, для которых строка действительно вставлена. Конкурентное
+        добавление тех же связей поэтому не увеличит счётчики дважды."""
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        fields = [field for field in self.model._meta.concrete_fields
+                  if not field.primary_key]
+        column = quote(self.model._meta.get_field(self.field).column)
+        objects = [self.model(user=self.user, **{f'{self.field}_id': pk})
+                   for pk in sorted(ids)]
+        batch_size = connection.ops.bulk_batch_size(fields, objects)
+        inserted = set()
+        with connection.cursor() as cursor:
+            for start in range(0, len(objects), batch_size):
+                batch = objects[start:start + batch_size]
+                cursor.execute(
+                    f'INSERT INTO {quote(self.model._meta.db_table)} '
+                    f'({", ".join(quote(field.column) for field in fields)})'
+                    ' VALUES ' + ', '.join(
+                        ['(' + ', '.join(['%s'] * len(fields)) + ')']
+                        * len(batch))
+                    + f' ON CONFLICT ({quote("user_id")}, {column}) '
+                    f'DO NOTHING RETURNING {column}',
+                    [field.get_db_prep_save(field.pre_save(obj, True),
+                                            connection)
+                     for obj in batch for field in fields])
+                inserted.update(row[0] for row in cursor.fetchall())
+        return inserted
+
+    def relations_changed(self, ids, delta):
+        """Обновляет счётчики, связи пользователя и кэш аутентификации
+        авторов после добавления (delta=1) или удаления (delta=-1)."""
+        change_counters(self.model, ids, delta)
+        UserMemberships.invalidate(self.membership, self.user.id)
+        if self.model is Subscription:
+            CachedTokenAuthentication.invalidate_users(ids)
+
+    @transaction.atomic
+    def add(self, ids):
+        """Добавляет связи. Возвращает {id: статус}: created,
+        exists, not_found или invalid (подписка на себя)."""
+        invalid = {self.user.id} if self.model is Subscription else set()
+        found = self.get_found(set(ids) - invalid)
+        existing = self.get_existing(found)
+        created = self.insert_relations(found - existing)
+        existing = found - created
+        if created:
+            self.relations_changed(created, 1)
+            if self.model is ShoppingCart:
+                ShoppingListService.apply_changes(
+                    [self.user.id], get_recipe_amounts(*created))
+        return {pk: 'created' if pk in created
+                else 'exists' if pk in existing
+                else 'invalid' if pk in invalid else 'not_found'
+                for pk in ids}
+
+    @transaction.atomic
+    def remove(self, ids):
+        """Удаляет связи. Обработчики сигналов удаления отложены,
+        счётчики и кэши обновляются одним запросом на все связи.
+        Строки блокируются до удаления, поэтому счётчики уменьшаются
+        ровно на число удалённых связей. Возвращает {id: статус}:
+        deleted, not_added или not_found."""
+        existing = set(self.get_relations(ids).select_for_update()
+                       .values_list(self.field, flat=True))
+        if existing:
+            with defer_relation_signals():
+                self.get_relations(existing).delete()
+            self.relations_changed(existing, -1)
+            if self.model is ShoppingCart:
+                ShoppingListService.apply_changes(
+                    [self.user.id],
+                    {ingredient_id: -amount for ingredient_id, amount
+                     in get_recipe_amounts(*existing).items()})
+        found = existing | self.get_found(set(ids) - existing)
+        return {pk: 'deleted' if pk in existing
+                else 'not_added' if pk in found else 'not_found'
+                for pk in ids}
+
+    @classmethod
+    def respond(cls, serializer_class, request, model):
+        """POST добавляет, DELETE удаляет связи с id из 'ids'."""
+        serializer = serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        service = cls(request.user, model)
+        results = (service.add(ids) if request.method == 'POST'
+                   else service.remove(ids))
+        return Response({'results': [
+            {'id': pk, 'status': result} for pk, result in results.items()]})
+
+
+class PantryService:
+    """Подбор рецептов по имеющимся у пользователя ингредиентам."""
+
+    @staticmethod
+    def match(ingredient_ids):
+        """Возвращает id рецептов, в которых есть хотя бы один из
+        ингредиентов, с полями matched_count (сколько ингредиентов
+        рецепта есть у пользователя), ingredients_count и coverage
+        (доля имеющихся ингредиентов). Все числа считаются одним
+        сгруппированным запросом по RecipeIngredient, отсортированным
+        по убыванию coverage, поэтому при срезе страницы база
+        сортирует только её строки."""
+        matched = Q(ingredient__in=ingredient_ids)
+        return RecipeIngredient.objects.filter(
+            recipe__in=RecipeIngredient.objects.filter(
+                matched).values('recipe'),
+        ).values('recipe', 'recipe__pub_date').annotate(
+            matched_count=Count('id', filter=matched),
+            ingredients_count=Count('id'),
+        ).annotate(
+            coverage=ExpressionWrapper(
+                F('matched_count') * 1.0 / F('ingredients_count'),
+                output_field=FloatField()),
+        ).order_by('-coverage', '-matched_count', '-recipe__pub_date',
+                   '-recipe')
+
+    @staticmethod
+    def get_recipes(queryset, rows):
+        """Загружает рецепты строк, полученных из match, в их порядке
+        и переносит на них посчитанные числа. Рецепты, удалённые
+        между запросами, пропускаются."""
+        recipes = queryset.in_bulk([row['recipe'] for row in rows])
+        result = []
+        for row in rows:
+            recipe = recipes.get(row['recipe'])
+            if recipe is None:
+                continue
+            recipe.matched_count = row['matched_count']
+            recipe.ingredients_count = row['ingredients_count']
+            recipe.coverage = row['coverage']
+            result.append(recipe)
+        return result
+
+
 class ShoppingListService:
-    """Сервис для работы со списком покупок."""
+    """Сервис для работы со списком покупок.
+    Список покупок хранится в ShoppingListItem в уже просуммированном
+    виде и обновляется при каждом изменении корзины или рецептов в ней."""
     def __init__(self, user):
         self.user = user
 
-    def get_shopping_list(self):
-        shopping_list = ShoppingCart.objects.filter(user=self.user)
-        ingredients = {}
-        for item in shopping_list:
-            for recipe_ingredient in item.recipe.recipes.all():
-                name = recipe_ingredient.ingredient.name
-                amount = recipe_ingredient.amount
-                unit = recipe_ingredient.ingredient.measurement_unit
-                if name in ingredients:
-                    ingredients[name]['amount'] += amount
-                else:
-                    ingredients[name] = {'amount': amount, 'unit': unit}
-
-        content_lines = ["Список покупок:\n"]
-        for name, info in ingredients.items():
-            line = f'{name} — {info["amount"]} {info["unit"]}'
-            content_lines.append(line)
-        content = "\n".join(content_lines)
-
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment;'
-        'filename="shopping_list.txt"'
-        return response
+    def get_ingredients(self):
+        """Возвращает ингредиенты из списка покупок пользователя."""
+        return ShoppingListItem.objects.filter(
+            user=self.user, amount__gt=0
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+    def aggregate_ingredients(self):
+        """Считает список покупок заново по рецептам в корзине.
+        Возвращает словарь {id ингредиента: количество}."""
+        return dict(RecipeIngredient.objects.filter(
+            recipe__in_shopping_cart__user=self.user
+        ).values('ingredient').annotate(
+            total=Sum('amount')
+        ).values_list('ingredient', 'total').order_by())
+
+    def add_recipe(self, recipe):
+        """Добавляет ингредиенты рецепта в список покупок."""
+        self.apply_changes([self.user.id], get_recipe_amounts(recipe))
+
+    def remove_recipe(self, recipe):
+        """Убирает ингредиенты рецепта из списка покупок."""
+        self.apply_changes(
+            [self.user.id],
+            {ingredient_id: -amount for ingredient_id, amount
+             in get_recipe_amounts(recipe).items()})
+
+    @classmethod
+    def change_recipe(cls, recipe, old_amounts, new_amounts):
+        """Применяет изменение ингредиентов рецепта к спискам покупок
+        всех пользователей, у которых рецепт лежит в корзине.
+        Количества передаются в виде {id ингредиента: количество}."""
+        changes = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in new_amounts.keys() | old_amounts.keys()}
+        changes = {key: value for key, value in changes.items() if value}
+        if changes:
+            cls.apply_changes(
+                ShoppingCart.objects.filter(recipe=recipe).values_list(
+                    'user', flat=True),
+                changes)
+
+    @classmethod
+    @contextmanager
+    def track_recipes(cls, *recipes):
+        """Переносит в списки покупок изменения ингредиентов рецептов,
+        сделанные внутри блока в обход сериализатора (например,
+        в админке)."""
+        old_amounts = {recipe: get_recipe_amounts(recipe)
+                       for recipe in recipes}
+        yield
+        for recipe, amounts in old_amounts.items():
+            cls.change_recipe(recipe, amounts, get_recipe_amounts(recipe))
+
+    @staticmethod
+    @transaction.atomic
+    def apply_changes(user_ids, changes):
+        """Прибавляет к спискам покупок пользователей изменения
+        вида {id ингредиента: количество}. Добавления записываются
+        через INSERT ... ON CONFLICT DO UPDATE, поэтому параллельные
+        добавления одного ингредиента не конфликтуют. Уменьшения
+        применяются одним UPDATE, позиции с нулевым количеством
+        удаляются."""
+        user_ids = sorted(set(user_ids))
+        if not user_ids or not changes:
+            return
+        added = {ingredient_id: change for ingredient_id, change
+                 in sorted(changes.items()) if change > 0}
+        removed = {ingredient_id: -change for ingredient_id, change
+                   in changes.items() if change < 0}
+        if added:
+            ShoppingListService.add_amounts([
+                (user_id, ingredient_id, amount) for user_id in user_ids
+                for ingredient_id, amount in added.items()])
+        if removed:
+            items = ShoppingListItem.objects.filter(
+                user__in=user_ids, ingredient__in=removed)
+            items.update(amount=Greatest(F('amount') - Case(
+                *(When(ingredient=ingredient_id, then=Value(amount))
+                  for ingredient_id, amount in removed.items())), 0))
+            items.filter(amount=0).delete()
+
+    @staticmethod
+    def add_amounts(rows):
+        """Прибавляет количества (пользователь, ингредиент, количество)
+        к позициям списков покупок, создавая недостающие."""
+        connection = connections[router.db_for_write(ShoppingListItem)]
+        quote = connection.ops.quote_name
+        table = quote(ShoppingListItem._meta.db_table)
+        columns = ('user_id', 'ingredient_id', 'amount')
+        batch_size = connection.ops.bulk_batch_size(columns, rows)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    f'({", ".join(map(quote, columns))}) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + f' ON CONFLICT ({quote("user_id")}, '
+                    f'{quote("ingredient_id")}) DO UPDATE SET '
+                    f'{quote("amount")} = {table}.{quote("amount")} '
+                    f'+ EXCLUDED.{quote("amount")}',
+                    [value for row in batch for value in row])
+
+    @transaction.atomic
+    def rebuild(self):
+        """Пересобирает список покупок пользователя по корзине."""
+        ShoppingListItem.objects.filter(user=self.user).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user=self.user, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in self.aggregate_ingredients().items())
+
+    def verify(self):
+        """Проверяет, что сохранённый список покупок совпадает
+        со списком, посчитанным по корзине."""
+        stored = dict(ShoppingListItem.objects.filter(
+            user=self.user, amount__gt=0
+        ).values_list('ingredient', 'amount'))
+        return stored == self.aggregate_ingredients()
+
+    def get_shopping_list(self, export_format='txt'):
+        """Возвращает файл со списком покупок в запрошенном формате.
+        Строки читаются из базы итератором и передаются выгрузке."""
+        exporter_class = EXPORTERS.get(export_format)
+        if exporter_class is None:
+            raise ValidationError(
+                f'Доступные форматы: {", ".join(EXPORTERS)}')
+        return exporter_class(self.get_ingredients().iterator()).get_response()
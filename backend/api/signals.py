@@ -0,0 +1,173 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import CachedTokenAuthentication
+from .autocomplete import ingredient_index
+from .caching import bump_version
+from .memberships import UserMemberships
+from .services import ShoppingListService, get_recipe_amounts
+from .tags import tag_slugs
+from recipes.counters import (COUNTERS, change_counter,
+                              relation_signals_deferred)
+from recipes.models import (Favorite, Ingredient, Recipe,
+                            RecipeImageVariant, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.search import schedule_search_index_update
+from users.models import Subscription
+from users.signals import users_updated
+
+User = get_user_model()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """Убирает ингредиенты удаляемого рецепта из списков покупок."""
+    ShoppingListService.apply_changes(
+        instance.in_shopping_cart.values_list('user', flat=True),
+        {ingredient_id: -amount for ingredient_id, amount
+         in get_recipe_amounts(instance).items()})
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Сбрасывает индекс автодополнения ингредиентов."""
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_slugs(sender, **kwargs):
+    """Сбрасывает соответствие слагов тегов их id."""
+    tag_slugs.invalidate()
+
+
+CACHE_SCOPES = {
+    Tag: ('tags', 'recipes'),
+    Ingredient: ('ingredients', 'recipes'),
+    Recipe: ('recipes',),
+    RecipeIngredient: ('recipes',),
+    Recipe.tags.through: ('recipes',),
+    RecipeImageVariant: ('recipes',),
+}
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    """Обновляет версии кэшированных ответов при изменении данных."""
+    bump_version(*CACHE_SCOPES[sender])
+
+
+# Промежуточные таблицы ManyToMany меняются через m2m_changed,
+# остальные модели — через post_save и post_delete.
+for model in CACHE_SCOPES:
+    if model._meta.auto_created:
+        m2m_changed.connect(invalidate_cached_responses, sender=model)
+    else:
+        post_save.connect(invalidate_cached_responses, sender=model)
+        post_delete.connect(invalidate_cached_responses, sender=model)
+
+
+MEMBERSHIP_RELATIONS = {
+    Favorite: 'favorites',
+    ShoppingCart: 'shopping_cart',
+    Subscription: 'subscriptions',
+}
+
+
+def invalidate_memberships(sender, instance, **kwargs):
+    """Сбрасывает связи пользователя при изменении избранного,
+    списка покупок или подписок."""
+    if relation_signals_deferred.get():
+        return
+    UserMemberships.invalidate(MEMBERSHIP_RELATIONS[sender], instance.user_id)
+
+
+for model in MEMBERSHIP_RELATIONS:
+    post_save.connect(invalidate_memberships, sender=model)
+    post_delete.connect(invalidate_memberships, sender=model)
+
+
+def increment_counters(sender, instance, created, **kwargs):
+    """Увеличивает счётчики избранного, списков покупок,
+    рецептов и подписчиков при создании связи."""
+    if created and not relation_signals_deferred.get():
+        change_counter(instance, 1)
+        invalidate_counter_owner(sender, instance)
+
+
+def decrement_counters(sender, instance, **kwargs):
+    """Уменьшает счётчики при удалении связи."""
+    if relation_signals_deferred.get():
+        return
+    change_counter(instance, -1)
+    invalidate_counter_owner(sender, instance)
+
+
+# Обработчики подключаются только к моделям связей: обработчик
+# post_delete без sender отключает быстрое удаление для всех моделей.
+for model in COUNTERS:
+    post_save.connect(increment_counters, sender=model)
+    post_delete.connect(decrement_counters, sender=model)
+
+
+def invalidate_counter_owner(sender, instance):
+    """Счётчики пользователя меняются без сохранения модели,
+    поэтому закэшированный для аутентификации пользователь
+    сбрасывается отдельно."""
+    relation, model, field = COUNTERS[sender]
+    if model is User:
+        CachedTokenAuthentication.invalidate_user(
+            getattr(instance, f'{relation}_id'))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Сбрасывает кэш аутентификации при выходе пользователя."""
+    CachedTokenAuthentication.invalidate(instance.key)
+
+
+SERVICE_USER_FIELDS = frozenset(('last_login', 'password'))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created, update_fields,
+                                **kwargs):
+    """Обновляет версию кэшированных рецептов при изменении профиля
+    автора. Вход, смена пароля и пользователи без рецептов
+    кэш рецептов не затрагивают."""
+    if created or (update_fields and SERVICE_USER_FIELDS.issuperset(
+            update_fields)):
+        return
+    if Recipe.objects.filter(author=instance).exists():
+        bump_version('recipes')
+
+
+@receiver(post_save, sender=User)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """Сбрасывает кэш аутентификации при изменении пользователя:
+    смене пароля, блокировке, редактировании профиля."""
+    CachedTokenAuthentication.invalidate_user(instance.pk)
+
+
+@receiver(users_updated)
+def invalidate_updated_users(sender, ids, **kwargs):
+    """Сбрасывает кэш аутентификации пользователей, изменённых
+    update() queryset'а (например, массовая блокировка)."""
+    CachedTokenAuthentication.invalidate_users(ids)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipe_search_index(sender, instance, **kwargs):
+    """Обновляет полнотекстовый индекс рецепта."""
+    schedule_search_index_update(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_ingredient_search_index(sender, instance, **kwargs):
+    """Обновляет индекс рецепта при изменении его ингредиентов."""
+    schedule_search_index_update(instance.recipe_id)
@@ -0,0 +1,32 @@
+import threading
+
+from .caching import get_version
+from recipes.models import Tag
+
+
+class TagSlugMap:
+    """Соответствие слагов тегов их id в памяти процесса.
+    Строится при первом обращении и сбрасывается сигналами модели Tag,
+    а в других процессах — при смене версии области 'tags'."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slugs = None
+        self._version = None
+
+    def invalidate(self):
+        self._slugs = None
+
+    def get_ids(self, slugs):
+        """Возвращает id тегов с переданными слагами,
+        несуществующие слаги пропускаются."""
+        version = get_version('tags')
+        mapping = self._slugs
+        if mapping is None or self._version != version:
+            with self._lock:
+                mapping = self._slugs = dict(
+                    Tag.objects.values_list('slug', 'id'))
+                self._version = version
+        return {mapping[slug] for slug in slugs if slug in mapping}
+
+
+tag_slugs = TagSlugMap()
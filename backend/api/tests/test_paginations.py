@@ -0,0 +1,58 @@
+import json
+from base64 import urlsafe_b64encode
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+def make_cursor(values):
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class RecipeCursorTest(APITestCase):
+    """Курсорная пагинация рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com')
+        for number in range(3):
+            Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/images/test.jpg', cooking_time=10,
+                author=author)
+
+    def test_pages(self):
+        response = self.client.get('/api/recipes/', {'cursor': '',
+                                                     'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_count_modes(self):
+        for mode, count in (('exact', 3), ('estimate', 3), ('', None)):
+            with self.subTest(mode=mode):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': '', 'count': mode})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['count'], count)
+
+    def test_malformed_cursor(self):
+        for cursor in ('!!!', make_cursor(['notadate', '1']),
+                       make_cursor(['2024-01-01T00:00:00+00:00', 'abc']),
+                       make_cursor(['2024-01-01T00:00:00+00:00'])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/recipes/',
+                                           {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_ordering(self):
+        response = self.client.get(
+            '/api/recipes/', {'cursor': '', 'ordering': 'popular'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,230 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class RecipeReadQueriesTest(APITestCase):
+    """Число запросов списка и страницы рецепта
+    не зависит от числа рецептов, тегов и ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        authors = [User.objects.create_user(
+            username=f'author{number}', email=f'author{number}@example.com')
+            for number in range(3)]
+        tags = [Tag.objects.create(name=f'Тег {number}',
+                                   color=f'#00000{number}',
+                                   slug=f'tag-{number}')
+                for number in range(3)]
+        ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)]
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/images/test.jpg', cooking_time=10,
+                author=authors[number % len(authors)])
+            recipe.tags.set(tags[:number % 3 + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in ingredients[:number % 5 + 1])
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(user=cls.user, author=authors[0])
+        cls.recipe = recipe
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        # COUNT, рецепты с авторами, теги, изображения, ингредиенты
+        # и три множества связей пользователя.
+        for limit in (2, 10):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(8):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit})
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_retrieve_queries(self):
+        with self.assertNumQueries(7):
+            response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.data['id'], self.recipe.pk)
+        self.assertEqual(len(response.data['ingredients']), 2)
+
+    def test_pantry(self):
+        ingredients = Ingredient.objects.order_by('id')[:2]
+        params = {'ingredients': ','.join(
+            str(ingredient.pk) for ingredient in ingredients)}
+        # COUNT, число ингредиентов по рецептам, рецепты страницы,
+        # их теги, изображения, ингредиенты и множества связей.
+        for limit in (2, 10):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(9):
+                    response = self.client.get(
+                        '/api/recipes/pantry/', {**params, 'limit': limit})
+                self.assertEqual(len(response.data['results']), limit)
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(
+            [(recipe['name'], recipe['matched_count'],
+              recipe['ingredients_count'], recipe['coverage'])
+             for recipe in response.data['results'][:4]],
+            [('Рецепт 11', 2, 2, 1.0), ('Рецепт 6', 2, 2, 1.0),
+             ('Рецепт 1', 2, 2, 1.0), ('Рецепт 10', 1, 1, 1.0)])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteQueriesTest(APITestCase):
+    """Число запросов создания и изменения рецепта
+    не зависит от числа ингредиентов."""
+    sizes = (1, 10, 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.tags = [Tag.objects.create(name=f'Тег {number}',
+                                       color=f'#00000{number}',
+                                       slug=f'tag-{number}')
+                    for number in range(2)]
+        cls.ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(max(cls.sizes))]
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'PNG')
+        cls.image = ('data:image/png;base64,'
+                     + base64.b64encode(buffer.getvalue()).decode())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get_data(self, size, amount=1):
+        return {
+            'ingredients': [{'id': ingredient.id, 'amount': amount}
+                            for ingredient in self.ingredients[:size]],
+            'tags': [tag.id for tag in self.tags],
+            'image': self.image,
+            'name': f'Рецепт из {size}',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def assert_constant_queries(self, request):
+        """Выполняет request(size) для каждого размера и проверяет,
+        что число запросов совпадает с числом для первого размера."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            request(self.sizes[0])
+        for size in self.sizes[1:]:
+            cache.clear()
+            with self.subTest(size=size):
+                with self.assertNumQueries(len(queries)):
+                    request(size)
+
+    def test_create_queries(self):
+        def create(size):
+            response = self.client.post(
+                '/api/recipes/', self.get_data(size), format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(len(response.data['ingredients']), size)
+        self.assert_constant_queries(create)
+
+    def test_update_queries(self):
+        recipes = {}
+        for size in self.sizes:
+            response = self.client.post(
+                '/api/recipes/', self.get_data(size), format='json')
+            recipes[size] = response.data['id']
+
+        def update(size):
+            response = self.client.patch(
+                f'/api/recipes/{recipes[size]}/',
+                self.get_data(size, amount=2), format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(
+                {item['amount'] for item in response.data['ingredients']},
+                {2})
+        self.assert_constant_queries(update)
+
+
+class BulkRelationQueriesTest(APITestCase):
+    """Число запросов массового удаления из избранного и списка
+    покупок не зависит от числа id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        author = User.objects.create_user(
+            username='author', email='author@example.com')
+        ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)]
+        cls.recipes = []
+        for number in range(10):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/images/test.jpg', cooking_time=10,
+                author=author)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in ingredients)
+            cls.recipes.append(recipe.id)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def assert_constant_remove_queries(self, url):
+        counts = []
+        for size in (2, 10):
+            ids = self.recipes[:size]
+            self.client.post(url, {'ids': ids}, format='json')
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.delete(url, {'ids': ids},
+                                              format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Recipe.objects.filter(
+            favorites_count__gt=0).exists())
+        self.assertFalse(Recipe.objects.filter(carts_count__gt=0).exists())
+
+    def test_favorite_remove_queries(self):
+        self.assert_constant_remove_queries('/api/recipes/favorite/bulk/')
+
+    def test_shopping_cart_remove_queries(self):
+        self.assert_constant_remove_queries(
+            '/api/recipes/shopping_cart/bulk/')
+        self.assertFalse(self.user.shopping_list_items.exists())
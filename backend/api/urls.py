@@ -20,6 +20,9 @@ urlpatterns = [
     path('recipes/download_shopping_cart/',
          ShoppingListDownloadView.as_view({'get': 'download'}),
          name='download_shopping_cart'),
+    path('users/subscribe/bulk/',
+         SubscribeViewSet.as_view({'post': 'bulk', 'delete': 'bulk'}),
+         name='subscribe_bulk'),
     path('users/subscriptions/',
          SubscriptionViewSet.as_view({'get': 'list'}), name='subscriptions'),
     path('', include(router.urls)),
@@ -5,26 +5,45 @@ MIN_VALUE_VALIDATOR = 1
 MAX_VALUE_VALIDATOR = 32000
 
 
+def get_duplicates(ids):
+    """Повторяющиеся id в порядке первого повтора."""
+    seen, duplicates = set(), {}
+    for pk in ids:
+        if pk in seen:
+            duplicates[pk] = None
+        seen.add(pk)
+    return list(duplicates)
+
+
+def format_ids(ids):
+    return ', '.join(map(str, ids))
+
+
 def validate_recipe(validated_data):
     """Данные рецепта.
-    Проверяет наличие и корректность ингредиентов, тегов,
-    изображения и времени приготовления."""
+    Проверяет наличие ингредиентов, тегов, изображения и времени
+    приготовления и отсутствие повторов среди id ингредиентов и тегов."""
     ingredients_data = validated_data.pop('recipes', [])
     if not ingredients_data:
         raise ValidationError(
             'Рецепт должен содержать хотя бы один ингредиент.')
-    if any(ingredients_data.count(ingredient) > 1
-            for ingredient in ingredients_data):
-        raise ValidationError(
-            'Рецепт не должен содержать повторяющиеся ингредиенты.')
-
     tags_data = validated_data.pop('tags', [])
     if not tags_data:
         raise ValidationError(
             'Рецепт должен содержать хотя бы один тег.')
-    if len(tags_data) != len(set(tags_data)):
-        raise ValidationError(
-            'Рецепт не должен содержать повторяющиеся теги.')
+
+    errors = []
+    duplicates = get_duplicates(
+        ingredient['ingredient'] for ingredient in ingredients_data)
+    if duplicates:
+        errors.append('Рецепт не должен содержать повторяющиеся '
+                      f'ингредиенты: {format_ids(duplicates)}.')
+    duplicates = get_duplicates(tags_data)
+    if duplicates:
+        errors.append('Рецепт не должен содержать повторяющиеся '
+                      f'теги: {format_ids(duplicates)}.')
+    if errors:
+        raise ValidationError(errors)
 
     image_data = validated_data.get('image')
     if not image_data or image_data == "":
@@ -38,14 +57,7 @@ def validate_recipe(validated_data):
 
 
 def validate_subscription(user, author):
-    """Проверяет возможность подписки пользователя на автора."""
+    """Проверяет возможность подписки пользователя на автора.
+    Повторную подписку отсекает ограничение уникальности."""
     if user == author:
         raise ValidationError('Нельзя подписаться на себя')
-    if user.follower.filter(author=author).exists():
-        raise ValidationError('Нельзя подписаться дважды')
-
-
-def validate_unsubscription(user, author):
-    """Проверяет возможность отписки пользователя от автора."""
-    if not user.follower.filter(author=author).exists():
-        raise ValidationError('Вы не были подписаны на автора')
@@ -1,23 +1,35 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Prefetch, Subquery
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from .autocomplete import ingredient_index
+from .caching import CachedResponseMixin
 from .filters import IngredientFilter, RecipeFilter
-from .paginations import CustomLimitPaginator
+from .negotiations import IgnoreFormatContentNegotiation
+from .paginations import (CustomLimitPaginator, RecipePaginator,
+                          SubscriptionPaginator)
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
+from .serializers import (BulkIdsSerializer, FavoriteSerializer,
+                          IngredientSerializer, PantryRecipeSerializer,
                           RecipeCreateUpdateSerializer, RecipeReadSerializer,
                           ShoppingCartSerializer, SubscriptionSerializer,
                           TagSerializer, UserCreateSerializer,
-                          UserReadSerializer, UserСhangePasswordSerializer)
-from .services import RecipeService, ShoppingListService
-from .validators import validate_subscription, validate_unsubscription
-from recipes.models import Ingredient, Recipe, Tag
+                          UserReadSerializer, UserСhangePasswordSerializer,
+                          get_recipes_limit)
+from .services import (BulkRelationService, PantryService, RecipeService,
+                       ShoppingListService)
+from .validators import validate_subscription
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
 from users.models import Subscription
 
 
@@ -52,11 +64,23 @@ class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
     """Представление для подписок.
     Возвращает список подписок текущего пользователя."""
     permission_classes = (IsAuthenticated,)
-    pagination_class = CustomLimitPaginator
+    pagination_class = SubscriptionPaginator
 
     def list(self, request):
+        """Список подписок с количеством рецептов и первыми
+        'recipes_limit' рецептами каждого автора. Рецепты всех авторов
+        страницы загружаются одним запросом: для каждого автора
+        коррелированный подзапрос выбирает id его последних рецептов."""
         user = request.user
-        queryset = user.follower.all()
+        recipes = Recipe.objects.prefetch_related('image_variants')
+        limit = get_recipes_limit(request)
+        if limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author')).order_by(
+                    '-pub_date', '-id').values('pk')[:limit]))
+        queryset = user.follower.select_related('author').prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='limited_recipes'))
         page = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
             page, many=True, context={'request': request})
@@ -73,54 +97,140 @@ class SubscribeViewSet(viewsets.ViewSet):
         user = request.user
         author = get_object_or_404(User, id=user_id)
         validate_subscription(user, author)
-        queryset = Subscription.objects.create(author=author, user=user)
+        try:
+            with transaction.atomic():
+                queryset = Subscription.objects.create(
+                    author=author, user=user)
+        except IntegrityError:
+            raise ValidationError('Нельзя подписаться дважды')
         serializer = SubscriptionSerializer(
             queryset, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, user_id):
         """Удаление подписки."""
-        get_object_or_404(User, id=user_id)
-        validate_unsubscription(request.user, user_id)
-        get_object_or_404(Subscription, user=request.user,
-                          author_id=user_id).delete()
+        with transaction.atomic():
+            deleted, _ = Subscription.objects.filter(
+                user=request.user, author_id=user_id).delete()
+        if not deleted:
+            get_object_or_404(User, id=user_id)
+            raise ValidationError('Вы не были подписаны на автора')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk(self, request):
+        """Подписка на нескольких авторов и отписка от них."""
+        return BulkRelationService.respond(
+            BulkIdsSerializer, request, Subscription)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """Представление для модели тега."""
+    cache_scope = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
-    """Представление для модели ингредиента."""
+class IngredientViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """Представление для модели ингредиента.
+    Поиск по параметру 'name' обслуживается индексом в памяти,
+    если он включён, иначе фильтром по базе данных."""
+    cache_scope = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name or not settings.INGREDIENT_AUTOCOMPLETE['IN_MEMORY']:
+            return super().list(request, *args, **kwargs)
+        ingredients = ingredient_index.search(
+            name, settings.INGREDIENT_AUTOCOMPLETE['LIMIT'])
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
 
-class RecipeViewSet(viewsets.ModelViewSet, RecipeService):
+
+class RecipeViewSet(CachedResponseMixin, viewsets.ModelViewSet,
+                    RecipeService):
     """Представление для модели рецепта.
     Для просматра, создания, обновления и удаления рецепта.
-    Так же добавляет рецепт в избранное и список покупок"""
+    Так же добавляет рецепт в избранное и список покупок.
+    Рецепт для анонимного пользователя отдаётся из кэша."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeReadSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,
                           IsAuthorOrReadOnly)
-    pagination_class = CustomLimitPaginator
+    pagination_class = RecipePaginator
     filterset_class = RecipeFilter
+    cache_scope = 'recipes'
+
+    def use_response_cache(self, request):
+        return self.action == 'retrieve' and request.user.is_anonymous
+
+    def get_volatile_data(self, request, pk=None):
+        """Счётчики избранного и подписчиков меняются без смены
+        версии кэша и читаются из базы одним запросом."""
+        if not str(pk).isdigit():
+            return None
+        counters = Recipe.objects.filter(pk=pk).values(
+            'favorites_count', 'author__recipes_count',
+            'author__followers_count').first()
+        if counters is None:
+            return None
+        return {
+            'favorites_count': counters['favorites_count'],
+            'author': {
+                'recipes_count': counters['author__recipes_count'],
+                'followers_count': counters['author__followers_count'],
+            },
+        }
+
+    def get_queryset(self):
+        """Возвращает рецепты вместе со всеми связанными данными,
+        поэтому число запросов не зависит от размера страницы.
+        Флаги избранного, списка покупок и подписки на автора
+        берутся из связей пользователя (UserMemberships)."""
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'image_variants',
+            Prefetch('recipes', queryset=RecipeIngredient.objects
+                     .select_related('ingredient')),
+        )
 
     def get_serializer_class(self):
         """Возвращает класс сериализатора в зависимости от действия.
         """
         if self.action in ('create', 'partial_update'):
             return RecipeCreateUpdateSerializer
+        if self.action == 'pantry':
+            return PantryRecipeSerializer
         return RecipeReadSerializer
 
+    def get_serializer_context(self):
+        """В списках отдаются миниатюры, на странице рецепта -
+        крупный вариант изображения."""
+        context = super().get_serializer_context()
+        context['image_variant'] = (
+            'large' if self.action == 'retrieve' else 'thumbnail')
+        return context
+
+    @action(detail=False, methods=('GET',))
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из ингредиентов
+        'ingredients' (id через запятую), по убыванию доли
+        имеющихся ингредиентов."""
+        ingredient_ids = {
+            int(ingredient_id) for ingredient_id
+            in request.query_params.get('ingredients', '').split(',')
+            if ingredient_id.strip().isdigit()}
+        if not ingredient_ids:
+            raise ValidationError('Укажите id ингредиентов')
+        rows = self.paginate_queryset(PantryService.match(ingredient_ids))
+        serializer = self.get_serializer(
+            PantryService.get_recipes(self.get_queryset(), rows), many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=('POST', 'DELETE'))
     def favorite(self, request, pk):
         """Добавление и удаление рецептов из избранного."""
@@ -131,9 +241,30 @@ class RecipeViewSet(viewsets.ModelViewSet, RecipeService):
         """Добавление и удаление рецептов из списка покупок."""
         return RecipeService.add_delete(ShoppingCartSerializer, request, pk)
 
+    @action(detail=False, methods=('POST', 'DELETE'),
+            url_path='favorite/bulk', permission_classes=(IsAuthenticated,))
+    def favorite_bulk(self, request):
+        """Добавление и удаление нескольких рецептов из избранного."""
+        return BulkRelationService.respond(
+            BulkIdsSerializer, request, Favorite)
+
+    @action(detail=False, methods=('POST', 'DELETE'),
+            url_path='shopping_cart/bulk',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        """Добавление и удаление нескольких рецептов
+        из списка покупок."""
+        return BulkRelationService.respond(
+            BulkIdsSerializer, request, ShoppingCart)
+
 
 class ShoppingListDownloadView(viewsets.ReadOnlyModelViewSet):
-    """Представление для cкачивания списка покупок."""
+    """Представление для cкачивания списка покупок.
+    Формат файла задаётся параметром 'format': txt, csv или pdf."""
+    permission_classes = (IsAuthenticated,)
+    content_negotiation_class = IgnoreFormatContentNegotiation
+
     def download(self, request):
         service = ShoppingListService(request.user)
-        return service.get_shopping_list()
+        return service.get_shopping_list(
+            request.query_params.get('format', 'txt'))
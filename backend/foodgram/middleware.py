@@ -0,0 +1,143 @@
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from api.memberships import UserMemberships
+
+logger = logging.getLogger('foodgram.performance')
+
+
+class QueryCollector:
+    """Считает SQL-запросы и время их выполнения.
+    Подключается через connection.execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+@contextmanager
+def collect_queries(collector):
+    """Подключает collector ко всем соединениям с базами данных."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(collector))
+        yield
+
+
+class PerformanceMiddleware:
+    """Для каждого запроса измеряет число SQL-запросов, время БД,
+    время представления и рендеринга ответа. Результат отдаётся
+    в заголовке Server-Timing и пишется в лог 'foodgram.performance';
+    запросы сверх порогов логируются как предупреждения.
+    Запросы потокового ответа выполняются при его отдаче, поэтому
+    для него строка лога пишется после последней части,
+    а заголовок Server-Timing не отдаётся.
+    Если мониторинг выключен, middleware не подключается."""
+
+    def __init__(self, get_response):
+        options = settings.PERFORMANCE_MONITORING
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = set(filter(None, options['VIEWS']))
+        self.query_threshold = options['QUERY_THRESHOLD']
+        self.time_threshold = options['TIME_THRESHOLD']
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        request._performance = {}
+        start = time.perf_counter()
+        with collect_queries(collector):
+            response = self.get_response(request)
+        view_name = request._performance.get('view')
+        if view_name is None or self.views and view_name not in self.views:
+            return response
+        if response.streaming:
+            request._performance.setdefault('view_end', time.perf_counter())
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content,
+                collector, start)
+        else:
+            self.report(request, response, collector, start)
+        return response
+
+    def stream(self, request, response, content, collector, start):
+        """Отдаёт части потокового ответа, считая запросы
+        при их получении, и пишет лог после последней части."""
+        content = iter(content)
+        while True:
+            with collect_queries(collector):
+                chunk = next(content, None)
+            if chunk is None:
+                break
+            yield chunk
+        self.report(request, response, collector, start)
+
+    def report(self, request, response, collector, start):
+        total = time.perf_counter() - start
+        timings = request._performance
+        view_name = timings['view']
+        view_end = timings.get('view_end', start + total)
+        view = view_end - timings.get('view_start', start)
+        render = start + total - view_end
+        if not response.streaming:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={collector.duration * 1000:.1f};'
+                f'desc="{collector.count} queries"',
+                f'view;dur={view * 1000:.1f}',
+                f'render;dur={render * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        slow = (collector.count > self.query_threshold
+                or total * 1000 > self.time_threshold)
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(collector.duration * 1000, 1),
+            'view_ms': round(view * 1000, 1),
+            'render_ms': round(render * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'auth_cache': getattr(request, '_auth_cache', None),
+            'memberships': self.get_memberships_stats(request),
+            'slow': slow,
+        }))
+
+    @staticmethod
+    def get_memberships_stats(request):
+        """Попадания и промахи кэша связей пользователя в запросе
+        и доля попаданий с начала работы процесса."""
+        memberships = getattr(request, '_memberships', None)
+        if memberships is None:
+            return None
+        return {'hits': memberships.hits, 'misses': memberships.misses,
+                'hit_ratio': UserMemberships.stats()['hit_ratio']}
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(
+            view_func, 'view_class', None)
+        request._performance['view'] = (
+            view_class or view_func).__name__
+        request._performance['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """Ответы DRF рендерятся после выхода из представления,
+        поэтому время рендеринга считается отсюда."""
+        request._performance['view_end'] = time.perf_counter()
+        return response
@@ -0,0 +1,131 @@
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, OperationalError, connections
+
+STICKY_COOKIE = 'primary_db'
+STICKY_KEY = 'db:sticky:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Реплика текущего запроса: None — чтение из основной базы,
+# словарь — чтение с реплики, выбранной при первом чтении ('alias').
+use_replica = ContextVar('use_replica', default=None)
+
+
+class ReplicaRouter:
+    """Направляет чтение моделей из REPLICA_ROUTING['APPS'] на реплики,
+    если текущий запрос это разрешил (ReplicaMiddleware). Вне запросов
+    (команды, обработчики очередей) всё идёт в основную базу.
+    Реплика выбирается один раз на запрос, поэтому COUNT, страница
+    и prefetch читаются с одной реплики с одинаковым отставанием.
+    Реплика, к которой не удалось подключиться, исключается на
+    RETRY_SECONDS секунд."""
+    _unhealthy = {}
+
+    def __init__(self):
+        options = settings.REPLICA_ROUTING
+        self.replicas = tuple(options['REPLICAS'])
+        self.apps = set(options['APPS'])
+
+    def db_for_read(self, model, **hints):
+        state = use_replica.get()
+        if (not self.replicas or state is None
+                or model._meta.app_label not in self.apps):
+            return None
+        if 'alias' not in state:
+            state['alias'] = self.choose_replica()
+        return state['alias']
+
+    def choose_replica(self):
+        """Случайная доступная реплика или основная база."""
+        now = time.monotonic()
+        healthy = [alias for alias in self.replicas
+                   if self._unhealthy.get(alias, 0) <= now]
+        random.shuffle(healthy)
+        for alias in healthy:
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError:
+                self.mark_unhealthy(alias)
+                continue
+            return alias
+        return 'default'
+
+    @classmethod
+    def mark_unhealthy(cls, alias):
+        retry = settings.REPLICA_ROUTING['RETRY_SECONDS']
+        cls._unhealthy[alias] = time.monotonic() + retry
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплик для безопасных запросов к API.
+    После успешного изменяющего запроса клиент на STICKY_SECONDS
+    закрепляется за основной базой, чтобы видеть свои изменения:
+    по cookie и, для запросов с токеном, по ключу в кэше.
+    Если реплика отказала во время запроса (OperationalError),
+    она исключается, а представление выполняется заново
+    с чтением из основной базы."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.window = settings.REPLICA_ROUTING['STICKY_SECONDS']
+
+    @staticmethod
+    def get_sticky_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return STICKY_KEY.format(
+            hashlib.sha256(authorization.encode()).hexdigest())
+
+    def __call__(self, request):
+        sticky_key = self.get_sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        allowed = (safe and request.path.startswith('/api/')
+                   and STICKY_COOKIE not in request.COOKIES
+                   and not (sticky_key and cache.get(sticky_key)))
+        request._replica = {} if allowed else None
+        token = use_replica.set(request._replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if not safe and response.status_code < 400:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=self.window,
+                                httponly=True, samesite='Lax')
+            if sticky_key:
+                cache.set(sticky_key, True, self.window)
+        return response
+
+    def process_exception(self, request, exception):
+        state = getattr(request, '_replica', None)
+        if (not isinstance(exception, OperationalError) or not state
+                or state.get('alias', 'default') == 'default'):
+            return None
+        alias = state['alias']
+        ReplicaRouter.mark_unhealthy(alias)
+        try:
+            connections[alias].close()
+        except DatabaseError:
+            pass
+        state['alias'] = 'default'
+        match = request.resolver_match
+        return match.func(request, *match.args, **match.kwargs)
@@ -29,12 +29,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.middleware.PerformanceMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -68,6 +70,32 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=replica1,replica2.
+REPLICA_ROUTING = {
+    'REPLICAS': [],
+    'APPS': ('recipes', 'users'),
+    'STICKY_SECONDS': int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10)),
+    'RETRY_SECONDS': 30,
+}
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'], 'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_ROUTING['REPLICAS'].append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'TIMEOUT': 60 * 60 * 24,
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -104,6 +132,53 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+INGREDIENT_AUTOCOMPLETE = {
+    'IN_MEMORY': True,
+    'LIMIT': 50,
+}
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+PERFORMANCE_MONITORING = {
+    'ENABLED': os.getenv('PERFORMANCE_MONITORING', '').lower() == 'true',
+    'VIEWS': os.getenv(
+        'PERFORMANCE_MONITORING_VIEWS',
+        'RecipeViewSet,SubscriptionViewSet,ShoppingListDownloadView',
+    ).split(','),
+    'QUERY_THRESHOLD': int(os.getenv('PERFORMANCE_QUERY_THRESHOLD', 20)),
+    'TIME_THRESHOLD': int(os.getenv('PERFORMANCE_TIME_THRESHOLD', 500)),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 5
+
+BULK_RELATIONS_LIMIT = 100
+
+RECIPE_IMAGE = {
+    'MAX_UPLOAD_SIZE': 5 * 1024 * 1024,
+    'MAX_PIXELS': 24_000_000,
+    'VARIANTS': {
+        'thumbnail': {'size': (400, 400), 'format': 'WEBP',
+                      'quality': 80, 'crop': True},
+        'large': {'size': (1200, 1200), 'format': 'WEBP', 'quality': 85},
+    },
+}
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
@@ -111,7 +186,7 @@ REST_FRAMEWORK = {
 
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
@@ -0,0 +1,144 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import ResolverMatch
+from rest_framework.authtoken.models import Token
+
+from foodgram.routers import (STICKY_COOKIE, ReplicaMiddleware,
+                              ReplicaRouter, use_replica)
+from recipes.models import Recipe
+
+REPLICAS = ('replica_1', 'replica_2')
+REPLICA_ROUTING = {**settings.REPLICA_ROUTING, 'REPLICAS': REPLICAS}
+
+
+def get_connections(failing=()):
+    """Подключения к репликам: реплики из failing недоступны."""
+    connections = {alias: mock.Mock() for alias in REPLICAS}
+    for alias in failing:
+        connections[alias].ensure_connection.side_effect = (
+            OperationalError)
+    return connections
+
+
+@override_settings(REPLICA_ROUTING=REPLICA_ROUTING)
+class ReplicaRouterTest(SimpleTestCase):
+    """Выбор реплики для чтения."""
+
+    def setUp(self):
+        ReplicaRouter._unhealthy.clear()
+        self.router = ReplicaRouter()
+
+    def read(self, model=Recipe, count=20):
+        token = use_replica.set({})
+        try:
+            return {self.router.db_for_read(model) for _ in range(count)}
+        finally:
+            use_replica.reset(token)
+
+    def test_outside_request(self):
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_one_replica_per_request(self):
+        with mock.patch('foodgram.routers.connections', get_connections()):
+            aliases = self.read()
+        self.assertEqual(len(aliases), 1)
+        self.assertIn(aliases.pop(), REPLICAS)
+
+    def test_other_apps_read_default(self):
+        with mock.patch('foodgram.routers.connections', get_connections()):
+            self.assertEqual(self.read(Token), {None})
+
+    def test_unreachable_replica_skipped(self):
+        connections = get_connections(failing=('replica_1',))
+        with mock.patch('foodgram.routers.connections', connections):
+            for _ in range(5):
+                self.assertEqual(self.read(count=1), {'replica_2'})
+        self.assertIn('replica_1', ReplicaRouter._unhealthy)
+
+    def test_fallback_to_default(self):
+        with mock.patch('foodgram.routers.connections',
+                        get_connections(failing=REPLICAS)):
+            self.assertEqual(self.read(), {'default'})
+
+    def test_writes_go_to_default(self):
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+
+@override_settings(REPLICA_ROUTING=REPLICA_ROUTING)
+class ReplicaMiddlewareTest(SimpleTestCase):
+    """Разрешение чтения с реплик и закрепление за основной базой."""
+
+    def setUp(self):
+        ReplicaRouter._unhealthy.clear()
+        cache.clear()
+        self.factory = RequestFactory()
+        self.states = []
+
+    def get_response(self, request):
+        self.states.append(use_replica.get())
+        status = 400 if request.path.endswith('/invalid/') else 201
+        return HttpResponse(status=status)
+
+    def call(self, request):
+        return ReplicaMiddleware(self.get_response)(request)
+
+    def test_safe_api_request_reads_replica(self):
+        self.call(self.factory.get('/api/recipes/'))
+        self.call(self.factory.get('/admin/'))
+        self.assertEqual(self.states, [{}, None])
+
+    def test_sticky_cookie_after_write(self):
+        response = self.call(self.factory.post('/api/recipes/'))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.call(request)
+        self.assertEqual(self.states, [None, None])
+
+    def test_no_sticky_after_failed_write(self):
+        response = self.call(self.factory.post('/api/invalid/'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_sticky_token_after_write(self):
+        headers = {'HTTP_AUTHORIZATION': 'Token key'}
+        self.call(self.factory.post('/api/recipes/', **headers))
+        self.call(self.factory.get('/api/recipes/', **headers))
+        self.call(self.factory.get('/api/recipes/'))
+        self.assertEqual(self.states, [None, None, {}])
+
+    def test_replica_failure_retried_on_default(self):
+        def view(request):
+            self.states.append(dict(use_replica.get()))
+            return HttpResponse('ok')
+
+        request = self.factory.get('/api/recipes/')
+        request.resolver_match = ResolverMatch(view, (), {})
+        request._replica = {'alias': 'replica_1'}
+        middleware = ReplicaMiddleware(self.get_response)
+        connections = get_connections()
+        token = use_replica.set(request._replica)
+        try:
+            with mock.patch('foodgram.routers.connections', connections):
+                response = middleware.process_exception(
+                    request, OperationalError('server closed'))
+        finally:
+            use_replica.reset(token)
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(self.states, [{'alias': 'default'}])
+        self.assertIn('replica_1', ReplicaRouter._unhealthy)
+        connections['replica_1'].close.assert_called_once()
+
+    def test_other_errors_not_handled(self):
+        request = self.factory.get('/api/recipes/')
+        request._replica = {'alias': 'replica_1'}
+        middleware = ReplicaMiddleware(self.get_response)
+        self.assertIsNone(middleware.process_exception(
+            request, ValueError()))
+        request._replica = {'alias': 'default'}
+        self.assertIsNone(middleware.process_exception(
+            request, OperationalError()))
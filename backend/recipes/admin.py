@@ -1,7 +1,10 @@
 from django.contrib import admin
 
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from .admin_filters import AutocompleteFilter, AutocompleteFilterMixin
+from .images import schedule_image_processing
+from .models import (Favorite, ImageJob, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from api.services import ShoppingListService
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -10,42 +13,77 @@ class RecipeIngredientInline(admin.TabularInline):
     """
     model = Recipe.ingredients.through
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient')
 
 
 class RecipeIngredientAdmin(admin.ModelAdmin):
     """
     Отображает рецепт, ингредиент и количество в списке.
     Позволяет искать по названию рецепта и ингредиента.
+    Изменения переносятся в списки покупок.
     """
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe__author', 'ingredient')
     search_fields = ('recipe__name', 'ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        recipes = {obj.recipe_id, form.initial.get('recipe')} - {None}
+        with ShoppingListService.track_recipes(*recipes):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with ShoppingListService.track_recipes(obj.recipe_id):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipes = set(queryset.values_list('recipe', flat=True))
+        with ShoppingListService.track_recipes(*recipes):
+            super().delete_queryset(request, queryset)
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class AuthorFilter(AutocompleteFilter):
+    field_name = 'author'
+
+
+class RecipeAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     """
     Отображает название рецепта, автора и количество избранных в списке.
     Позволяет искать по названию и имени автора.
-    Позволяет фильтровать по автору, названию и тегам.
+    Позволяет фильтровать по автору (с автодополнением) и тегам.
     """
     inlines = (RecipeIngredientInline,)
     list_display = ('name', 'author', 'number_of_favorites')
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username')
-    list_filter = ('author', 'name', 'tags')
+    list_filter = (AuthorFilter, 'tags')
+    autocomplete_fields = ('author', 'tags')
+    show_full_result_count = False
+
+    def save_related(self, request, form, formsets, change):
+        with ShoppingListService.track_recipes(form.instance.pk):
+            super().save_related(request, form, formsets, change)
+        if 'image' in form.changed_data:
+            schedule_image_processing(form.instance)
 
     def number_of_favorites(self, obj):
-        return obj.in_favorites.count()
+        return obj.favorites_count
     number_of_favorites.short_description = 'Добавлено в Избранное'
+    number_of_favorites.admin_order_field = 'favorites_count'
 
 
 class IngredientAdmin(admin.ModelAdmin):
     """
     Отображает название и единицу измерения в списке.
     Позволяет искать по названию.
-    Позволяет фильтровать по названию.
     """
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
-    list_filter = ('name',)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -57,27 +95,63 @@ class TagAdmin(admin.ModelAdmin):
     search_fields = ('name', 'slug')
 
 
+class ImageJobAdmin(admin.ModelAdmin):
+    """
+    Отображает рецепт, статус и число попыток обработки изображения.
+    Позволяет фильтровать по статусу.
+    """
+    list_display = ('recipe', 'status', 'attempts', 'updated')
+    list_filter = ('status',)
+    list_select_related = ('recipe__author',)
+    readonly_fields = ('error',)
+
+
 class FavoriteAdmin(admin.ModelAdmin):
     """
     Отображает пользователя и рецепт в списке.
     Позволяет искать по имени пользователя и названию рецепта.
     """
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     """
     Отображает пользователя и рецепт в списке.
     Позволяет искать по имени пользователя и названию рецепта.
+    Добавление и удаление обновляют список покупок пользователя.
     """
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = ShoppingCart.objects.select_related('user').get(pk=obj.pk)
+            ShoppingListService(old.user).remove_recipe(old.recipe_id)
+        super().save_model(request, obj, form, change)
+        ShoppingListService(obj.user).add_recipe(obj.recipe_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ShoppingListService(obj.user).remove_recipe(obj.recipe_id)
+
+    def delete_queryset(self, request, queryset):
+        items = list(queryset.select_related('user'))
+        super().delete_queryset(request, queryset)
+        for item in items:
+            ShoppingListService(item.user).remove_recipe(item.recipe_id)
 
 
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
+admin.site.register(ImageJob, ImageJobAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
@@ -0,0 +1,49 @@
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Фильтр по внешнему ключу field_name. Вместо списка всех
+    значений показывает поле с автодополнением, поэтому боковая
+    панель не выбирает все связанные объекты."""
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        field = model._meta.get_field(self.field_name)
+        self.title = field.verbose_name
+        super().__init__(request, params, model, model_admin)
+        self.field = forms.ModelChoiceField(
+            queryset=field.remote_field.model.objects.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False)
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def value(self):
+        value = super().value()
+        return value if value and value.isdigit() else None
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(**{f'{self.field_name}_id': self.value()})
+
+    def rendered_widget(self):
+        return self.field.widget.render(self.parameter_name, self.value())
+
+
+class AutocompleteFilterMixin:
+    """Подключает скрипты автодополнения к списку объектов."""
+
+    @property
+    def media(self):
+        return (super().media
+                + AutocompleteSelect(None, self.admin_site).media
+                + forms.Media(js=('recipes/js/autocomplete_filter.js',)))
@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db.models import (Count, F, IntegerField, OuterRef, Q,
+                              Subquery)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+# Модель связи: (поле связи, модель со счётчиком, поле счётчика).
+COUNTERS = {
+    Favorite: ('recipe', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe', Recipe, 'carts_count'),
+    Recipe: ('author', User, 'recipes_count'),
+    Subscription: ('author', User, 'followers_count'),
+}
+
+relation_signals_deferred = ContextVar('relation_signals_deferred',
+                                       default=False)
+
+
+@contextmanager
+def defer_relation_signals():
+    """Внутри блока обработчики сигналов связей не меняют счётчики
+    и кэши: вызывающий код обновляет их сам, одним запросом
+    на все связи."""
+    token = relation_signals_deferred.set(True)
+    try:
+        yield
+    finally:
+        relation_signals_deferred.reset(token)
+
+
+def change_counter(instance, delta):
+    """Изменяет счётчик объекта, на который ссылается instance."""
+    relation = COUNTERS[type(instance)][0]
+    change_counters(type(instance), [getattr(instance, f'{relation}_id')],
+                    delta)
+
+
+def change_counters(relation_model, ids, delta):
+    """Изменяет счётчики объектов ids для связи relation_model одним
+    запросом. Обновление выполняется выражением F() в текущей
+    транзакции."""
+    relation, model, field = COUNTERS[relation_model]
+    value = F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+    model.objects.filter(pk__in=ids).update(**{field: value})
+
+
+def get_actual_count(relation_model, relation):
+    """Подзапрос, считающий связи для каждого объекта."""
+    return Coalesce(Subquery(
+        relation_model.objects.filter(**{relation: OuterRef('pk')})
+        .order_by().values(relation).annotate(count=Count('pk'))
+        .values('count'),
+        output_field=IntegerField()), 0)
+
+
+def reconcile_counters(verify=False):
+    """Сверяет счётчики с фактическим числом связей и, если verify
+    не задан, исправляет расхождения. Возвращает число расхождений
+    по каждому счётчику."""
+    drift = {}
+    for relation_model, (relation, model, field) in COUNTERS.items():
+        outdated = model.objects.annotate(
+            actual=get_actual_count(relation_model, relation),
+        ).filter(~Q(**{field: F('actual')}))
+        drift[f'{model._meta.model_name}.{field}'] = outdated.count()
+        if not verify:
+            model.objects.filter(pk__in=outdated.values('pk')).update(
+                **{field: get_actual_count(relation_model, relation)})
+    return drift
@@ -0,0 +1,75 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import ImageJob, RecipeImageVariant
+
+
+def render_variants(data, variants, max_pixels):
+    """Строит варианты изображения по настройкам variants.
+    Работает только с байтами, поэтому выполняется в отдельном процессе.
+    Возвращает список (название, байты, ширина, высота)."""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        source = source.convert(
+            'RGBA' if source.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        result = []
+        for name, options in variants.items():
+            if options.get('crop'):
+                # Маленькие изображения не увеличиваются.
+                width, height = options['size']
+                scale = min(1, source.width / width, source.height / height)
+                image = ImageOps.fit(
+                    source, (max(1, int(width * scale)),
+                             max(1, int(height * scale))), Image.LANCZOS)
+            else:
+                image = source.copy()
+                image.thumbnail(options['size'], Image.LANCZOS)
+            buffer = BytesIO()
+            image.save(buffer, options['format'],
+                       quality=options.get('quality', 85))
+            result.append((name, buffer.getvalue(), *image.size))
+        return result
+
+
+def schedule_image_processing(recipe):
+    """Удаляет варианты прежнего изображения рецепта
+    и ставит новое изображение в очередь на обработку."""
+    variants = list(recipe.image_variants.all())
+    RecipeImageVariant.objects.filter(recipe=recipe).delete()
+    ImageJob.objects.get_or_create(recipe=recipe, status=ImageJob.PENDING)
+
+    def delete_files():
+        for variant in variants:
+            variant.image.delete(save=False)
+    transaction.on_commit(delete_files)
+
+
+@transaction.atomic
+def save_variants(job, variants):
+    """Сохраняет построенные варианты и отмечает задачу выполненной.
+    Файлы заменённых вариантов удаляются после фиксации транзакции."""
+    replaced = list(RecipeImageVariant.objects.filter(
+        recipe_id=job.recipe_id,
+        name__in=[name for name, *_ in variants]))
+    for name, data, width, height in variants:
+        extension = settings.RECIPE_IMAGE['VARIANTS'][name]['format']
+        variant = RecipeImageVariant(
+            recipe_id=job.recipe_id, name=name, width=width, height=height)
+        variant.image.save(f'{job.recipe_id}_{name}.{extension.lower()}',
+                           ContentFile(data), save=False)
+        RecipeImageVariant.objects.filter(
+            recipe_id=job.recipe_id, name=name).delete()
+        variant.save()
+    job.status = ImageJob.DONE
+    job.error = ''
+    job.save(update_fields=('status', 'error', 'updated'))
+
+    def delete_files():
+        for variant in replaced:
+            variant.image.delete(save=False)
+    transaction.on_commit(delete_files)
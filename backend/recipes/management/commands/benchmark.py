@@ -0,0 +1,189 @@
+import base64
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+# Число ингредиентов в сценариях создания рецепта.
+RECIPE_SIZES = (1, 10, 50)
+
+
+def percentile(quantiles, value):
+    """Перцентиль из результата statistics.quantiles(n=100)."""
+    return round(quantiles[value - 1] * 1000, 2)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число SQL-запросов основных эндпоинтов '
+            'через тестовый клиент DRF и сравнивает их с сохранённым '
+            'базовым замером. Данные готовятся командой generate_fake_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--baseline', type=Path,
+                            help='JSON с базовым замером для сравнения')
+        parser.add_argument('--save', type=Path,
+                            help='сохранить результат как базовый замер')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='допустимый рост p95 и памяти, доля')
+        parser.add_argument('--only', action='append',
+                            help='запустить только указанные сценарии')
+
+    def get_scenarios(self):
+        """Сценарии: название -> (метод, путь, данные)."""
+        user = User.objects.annotate(
+            carts=Count('shopping_cart', distinct=True),
+            follows=Count('follower', distinct=True),
+        ).order_by('-follows', '-carts').first()
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        tag = Tag.objects.first()
+        ingredients = list(Ingredient.objects.values_list(
+            'id', flat=True)[:max(RECIPE_SIZES)])
+        if user is None or recipe is None or tag is None or (
+                len(ingredients) < max(RECIPE_SIZES)):
+            raise CommandError(
+                'Нет данных, сначала выполните generate_fake_data')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        image = self.get_image(recipe)
+        scenarios = {
+            'recipe_list': (
+                'get', '/api/recipes/', {'limit': 6}),
+            'recipe_list_filtered': (
+                'get', '/api/recipes/',
+                {'limit': 6, 'tags': tag.slug, 'is_favorited': 1}),
+            'recipe_detail': (
+                'get', f'/api/recipes/{recipe.pk}/', None),
+            'subscriptions': (
+                'get', '/api/users/subscriptions/', {'recipes_limit': 3}),
+            'shopping_list': (
+                'get', '/api/recipes/download_shopping_cart/', None),
+            'shopping_list_pdf': (
+                'get', '/api/recipes/download_shopping_cart/',
+                {'format': 'pdf'}),
+        }
+        for size in RECIPE_SIZES:
+            scenarios[f'recipe_create_{size}'] = ('post', '/api/recipes/', {
+                'ingredients': [{'id': ingredient_id, 'amount': 10}
+                                for ingredient_id in ingredients[:size]],
+                'tags': [tag.pk],
+                'image': image,
+                'name': 'Бенчмарк',
+                'text': 'Рецепт для замера',
+                'cooking_time': 10,
+            })
+        return scenarios
+
+    @staticmethod
+    def get_image(recipe):
+        with recipe.image.open('rb') as image:
+            return ('data:image/jpeg;base64,'
+                    + base64.b64encode(image.read()).decode())
+
+    def request(self, method, path, data):
+        """Выполняет запрос, изменения в базе откатываются."""
+        with transaction.atomic():
+            if method == 'get':
+                response = self.client.get(path, data)
+            else:
+                response = getattr(self.client, method)(
+                    path, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {path}: '
+                               f'{response.status_code}')
+
+    def measure(self, method, path, data, iterations, warmup):
+        for _ in range(warmup):
+            self.request(method, path, data)
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(iterations):
+                start = time.perf_counter()
+                self.request(method, path, data)
+                timings.append(time.perf_counter() - start)
+        quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+        result = {
+            'p50': percentile(quantiles, 50),
+            'p95': percentile(quantiles, 95),
+            'p99': percentile(quantiles, 99),
+            # Без учёта SAVEPOINT, которыми запрос обёрнут для отката.
+            'queries': sum(
+                not query['sql'].upper().startswith(('SAVEPOINT', 'RELEASE'))
+                for query in queries.captured_queries) // iterations,
+        }
+        # Пик памяти Python за один запрос, отдельно от замера времени:
+        # tracemalloc замедляет выполнение.
+        tracemalloc.start()
+        try:
+            self.request(method, path, data)
+            result['memory'] = round(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+        return result
+
+    def compare(self, results, baseline, tolerance):
+        """Возвращает список регрессий относительно базового замера."""
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {base["queries"]} -> '
+                    f'{result["queries"]}')
+            if result['p95'] > base['p95'] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: p95 {base["p95"]} -> {result["p95"]} мс')
+            if 'memory' in base and (
+                    result['memory'] > base['memory'] * (1 + tolerance)):
+                regressions.append(
+                    f'{name}: память {base["memory"]} -> '
+                    f'{result["memory"]} КиБ')
+        return regressions
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, iterations, warmup, baseline, save, tolerance,
+               only, **options):
+        if iterations < 2:
+            raise CommandError('Нужно не меньше двух итераций')
+        scenarios = self.get_scenarios()
+        if only:
+            scenarios = {name: scenario for name, scenario
+                         in scenarios.items() if name in only}
+        results = {}
+        self.stdout.write(f'{"сценарий":<24}{"p50":>9}{"p95":>9}'
+                          f'{"p99":>9}{"запросы":>9}{"КиБ":>9}')
+        for name, (method, path, data) in scenarios.items():
+            result = self.measure(method, path, data, iterations, warmup)
+            results[name] = result
+            self.stdout.write(
+                f'{name:<24}{result["p50"]:>9}{result["p95"]:>9}'
+                f'{result["p99"]:>9}{result["queries"]:>9}'
+                f'{result["memory"]:>9}')
+        if save:
+            save.write_text(json.dumps(results, indent=2))
+            self.stdout.write(f'Базовый замер сохранён в {save}')
+        if baseline:
+            regressions = self.compare(
+                results, json.loads(baseline.read_text()), tolerance)
+            if regressions:
+                raise CommandError(
+                    'Регрессии:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
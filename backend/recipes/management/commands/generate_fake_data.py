@@ -0,0 +1,173 @@
+import random
+import time
+from collections import defaultdict
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+
+from api.caching import bump_version
+from recipes.counters import reconcile_counters
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.search import update_search_index
+from users.models import Subscription
+
+User = get_user_model()
+
+WORDS = ('борщ', 'суп', 'салат', 'пирог', 'каша', 'омлет', 'рагу',
+         'плов', 'запеканка', 'котлеты', 'блины', 'паста', 'соус')
+
+
+def batched(items, size):
+    """Делит список на части не больше size."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетические данные для нагрузочного тестирования: '
+            'пользователей, теги, рецепты с ингредиентами, избранное, '
+            'корзины и подписки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='создаются, если ингредиентов меньше')
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='рецептов в избранном у пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='рецептов в корзине у пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='подписок у пользователя')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='fake')
+
+    def bulk_create(self, model, objects, **kwargs):
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, **kwargs)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: '
+                          f'{len(objects)}')
+
+    @staticmethod
+    def placeholder_image(prefix):
+        """Одно изображение на все рецепты."""
+        buffer = BytesIO()
+        Image.new('RGB', (600, 400), (230, 180, 120)).save(buffer, 'JPEG')
+        return default_storage.save(f'recipes/images/{prefix}.jpg',
+                                    ContentFile(buffer.getvalue()))
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        started = time.monotonic()
+        with transaction.atomic():
+            self.generate(rng, prefix, options)
+        bump_version('tags', 'ingredients', 'recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'))
+
+    def generate(self, rng, prefix, options):
+        # Повторный запуск добавляет новые данные к уже созданным.
+        offset = User.objects.filter(
+            username__startswith=f'{prefix}_').count()
+        last_user_id = User.objects.aggregate(last=Max('id'))['last'] or 0
+        password = make_password('password')
+        self.bulk_create(User, [
+            User(username=f'{prefix}_{number}', password=password,
+                 email=f'{prefix}_{number}@example.com',
+                 first_name='Имя', last_name='Фамилия')
+            for number in range(offset, offset + options['users'])])
+        user_ids = list(User.objects.filter(
+            id__gt=last_user_id, username__startswith=f'{prefix}_',
+        ).values_list('id', flat=True))
+
+        self.bulk_create(Tag, [
+            Tag(name=f'{prefix} {number}', slug=f'{prefix}-{number}',
+                color=f'#{rng.randrange(16 ** 6):06X}')
+            for number in range(options['tags'])], ignore_conflicts=True)
+        tag_ids = list(Tag.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('id', flat=True))
+
+        missing = options['ingredients'] - Ingredient.objects.count()
+        if missing > 0:
+            self.bulk_create(Ingredient, [
+                Ingredient(name=f'{prefix} {number}', measurement_unit='г')
+                for number in range(missing)], ignore_conflicts=True)
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True))
+
+        image = self.placeholder_image(prefix)
+        last_recipe_id = Recipe.objects.aggregate(
+            last=Max('id'))['last'] or 0
+        self.bulk_create(Recipe, [
+            Recipe(name=f'{prefix} {rng.choice(WORDS)} {number}',
+                   text=' '.join(rng.choices(WORDS, k=30)), image=image,
+                   author_id=rng.choice(user_ids),
+                   cooking_time=rng.randint(1, 180))
+            for number in range(options['recipes'])])
+        recipe_ids = list(Recipe.objects.filter(
+            id__gt=last_recipe_id, image=image,
+        ).values_list('id', flat=True))
+
+        self.bulk_create(Recipe.tags.through, [
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, min(2, len(tag_ids)))])
+
+        per_recipe = min(options['ingredients_per_recipe'],
+                         len(ingredient_ids))
+        amounts = {}
+        for recipe_id in recipe_ids:
+            amounts[recipe_id] = {
+                ingredient_id: rng.randint(1, 500)
+                for ingredient_id in rng.sample(ingredient_ids, per_recipe)}
+        self.bulk_create(RecipeIngredient, [
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=amount)
+            for recipe_id, items in amounts.items()
+            for ingredient_id, amount in items.items()])
+
+        def sample(population, count):
+            return rng.sample(population, min(count, len(population)))
+
+        self.bulk_create(Favorite, [
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in sample(recipe_ids, options['favorites'])])
+        carts = [(user_id, recipe_id) for user_id in user_ids
+                 for recipe_id in sample(recipe_ids, options['carts'])]
+        self.bulk_create(ShoppingCart, [
+            ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in carts])
+        shopping_lists = defaultdict(int)
+        for user_id, recipe_id in carts:
+            for ingredient_id, amount in amounts[recipe_id].items():
+                shopping_lists[user_id, ingredient_id] += amount
+        self.bulk_create(ShoppingListItem, [
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             amount=amount)
+            for (user_id, ingredient_id), amount
+            in shopping_lists.items()])
+        count = options['subscriptions']
+        self.bulk_create(Subscription, [
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in [
+                author_id for author_id in sample(user_ids, count + 1)
+                if author_id != user_id][:count]])
+
+        for batch in batched(recipe_ids, self.batch_size):
+            update_search_index(batch)
+        reconcile_counters()
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.caching import bump_version
+from recipes.models import Ingredient
+
+
+def read_csv(file):
+    """Построчно читает CSV без заголовка: название, единица измерения."""
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Читает JSON-массив объектов {"name", "measurement_unit"},
+    не загружая файл в память целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Файл JSON обрезан')
+            buffer += chunk
+            continue
+        yield item['name'], item['measurement_unit']
+        buffer = buffer[end:]
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON. Уже существующие '
+            'пары (название, единица измерения) пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path,
+                            help='файл data/ingredients.csv или .json')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, path, batch_size, **options):
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(
+                f'Поддерживаемые форматы: {", ".join(READERS)}')
+        started = time.perf_counter()
+        count_before = Ingredient.objects.count()
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            rows = ((name.strip(), unit.strip())
+                    for name, unit in reader(file))
+            if connection.vendor == 'postgresql':
+                read = self.copy(rows, batch_size)
+            else:
+                read = self.bulk_create(rows, batch_size)
+            bump_version('ingredients')
+        created = Ingredient.objects.count() - count_before
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, добавлено {created} ингредиентов '
+            f'за {elapsed:.2f} с ({read / max(elapsed, 1e-6):.0f} строк/с)'))
+
+    def bulk_create(self, rows, batch_size):
+        read = 0
+        while True:
+            batch = [Ingredient(name=name, measurement_unit=unit)
+                     for name, unit in islice(rows, batch_size)]
+            if not batch:
+                return read
+            Ingredient.objects.bulk_create(
+                batch, batch_size=batch_size, ignore_conflicts=True)
+            read += len(batch)
+
+    def copy(self, rows, batch_size):
+        """Копирует строки во временную таблицу командой COPY
+        и переносит новые в таблицу ингредиентов одним INSERT."""
+        table = Ingredient._meta.db_table
+        read = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP')
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)', buffer)
+                read += len(batch)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_staging '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING')
+        return read
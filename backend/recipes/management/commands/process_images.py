@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.images import render_variants, save_variants
+from recipes.models import ImageJob
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)
+
+
+class Command(BaseCommand):
+    help = ('Строит миниатюры и WebP-варианты изображений рецептов '
+            'из очереди ImageJob.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Пауза между опросами очереди, с.')
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь и завершиться.')
+
+    @staticmethod
+    @transaction.atomic
+    def claim(batch_size):
+        """Забирает задачи из очереди. Заблокированные другим
+        обработчиком строки пропускаются."""
+        jobs = list(ImageJob.objects.select_for_update(
+            skip_locked=True, of=('self',)).select_related('recipe').filter(
+            status=ImageJob.PENDING)[:batch_size])
+        ImageJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=ImageJob.PROCESSING, attempts=F('attempts') + 1,
+            updated=timezone.now())
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    @staticmethod
+    def fail(job, error):
+        """Возвращает задачу в очередь или отмечает её неудачной."""
+        job.status = (ImageJob.FAILED if job.attempts >= MAX_ATTEMPTS
+                      else ImageJob.PENDING)
+        job.error = str(error)
+        job.save(update_fields=('status', 'error', 'updated'))
+
+    def process(self, pool, jobs):
+        options = settings.RECIPE_IMAGE
+        futures = {}
+        for job in jobs:
+            try:
+                with job.recipe.image.open('rb') as image:
+                    data = image.read()
+            except (OSError, ValueError) as error:
+                self.fail(job, error)
+                continue
+            futures[job] = pool.submit(
+                render_variants, data, options['VARIANTS'],
+                options['MAX_PIXELS'])
+        for job, future in futures.items():
+            try:
+                save_variants(job, future.result())
+            except Exception as error:
+                self.fail(job, error)
+                self.stderr.write(f'Рецепт {job.recipe_id}: {error}')
+
+    def handle(self, *args, workers, batch_size, interval, once, **options):
+        # Задачи, брошенные остановленным обработчиком.
+        ImageJob.objects.filter(
+            status=ImageJob.PROCESSING,
+            updated__lt=timezone.now() - STALE_AFTER,
+        ).update(status=ImageJob.PENDING)
+        processed = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                jobs = self.claim(batch_size)
+                if jobs:
+                    self.process(pool, jobs)
+                    processed += len(jobs)
+                    continue
+                if once:
+                    break
+                time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}'))
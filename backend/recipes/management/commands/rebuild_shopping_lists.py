@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services import ShoppingListService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает сохранённые списки покупок по корзинам '
+            'пользователей или проверяет их актуальность (--verify).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='user_ids', help='id пользователя')
+        parser.add_argument('--verify', action='store_true',
+                            help='только проверить, ничего не изменяя')
+
+    def handle(self, *args, user_ids=None, verify=False, **options):
+        users = User.objects.filter(shopping_cart__isnull=False)
+        users = users | User.objects.filter(
+            shopping_list_items__isnull=False)
+        if user_ids:
+            users = User.objects.filter(id__in=user_ids)
+        outdated = 0
+        for user in users.distinct().iterator():
+            service = ShoppingListService(user)
+            if service.verify():
+                continue
+            outdated += 1
+            if verify:
+                self.stdout.write(f'Список покупок устарел: {user}')
+            else:
+                service.rebuild()
+        if verify and outdated:
+            raise CommandError(f'Устаревших списков покупок: {outdated}')
+        message = (f'Пересобрано списков покупок: {outdated}'
+                   if not verify else 'Все списки покупок актуальны')
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, списков покупок, рецептов '
+            'и подписчиков с фактическими данными и исправляет '
+            'расхождения или только сообщает о них (--verify).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='только проверить, ничего не изменяя')
+
+    def handle(self, *args, verify=False, **options):
+        drift = reconcile_counters(verify=verify)
+        for counter, outdated in drift.items():
+            if outdated:
+                self.stdout.write(f'{counter}: расхождений {outdated}')
+        total = sum(drift.values())
+        if verify and total:
+            raise CommandError(f'Устаревших счётчиков: {total}')
+        message = (f'Исправлено счётчиков: {total}'
+                   if not verify else 'Все счётчики актуальны')
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,242 @@
+import json
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from .benchmark import percentile
+
+User = get_user_model()
+
+METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'}
+
+
+def get_route(path):
+    """Путь без id: /api/recipes/12/ -> /api/recipes/{id}/."""
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path.split('?')[0])
+
+
+def read_log(path):
+    """Читает записи (method, path, query, body, user, token)
+    из JSON-lines. Строки без метода или пути пропускаются."""
+    entries, skipped = [], 0
+    with path.open(encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            method = str(entry.get('method', '')).upper()
+            if method not in METHODS or not entry.get('path'):
+                skipped += 1
+                continue
+            query = entry.get('query') or {}
+            if isinstance(query, str):
+                query = parse_qs(query.lstrip('?'))
+            entries.append({
+                'method': method,
+                'path': entry['path'],
+                'query': query,
+                'body': entry.get('body'),
+                'user': entry.get('user'),
+                'token': entry.get('token'),
+            })
+    return entries, skipped
+
+
+class Command(BaseCommand):
+    help = ('Воспроизводит журнал запросов в формате JSON-lines '
+            '(method, path, query, body, user, token) внутри процесса или '
+            'против запущенного сервера и выводит пропускную способность, '
+            'перцентили задержки и долю ошибок по маршрутам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, help='журнал запросов')
+        parser.add_argument('--base-url',
+                            help='адрес сервера, например http://localhost')
+        parser.add_argument('--tokens', type=Path,
+                            help='JSON с токенами пользователей журнала '
+                                 '{user: token} для --base-url')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=1)
+        parser.add_argument('--rollback', action='store_true',
+                            help='откатывать изменения (только внутри '
+                                 'процесса)')
+        parser.add_argument('--output', type=Path,
+                            help='сохранить результат в JSON')
+
+    @staticmethod
+    def resolve_users(entries):
+        """Пользователь записи задаётся id, username или email."""
+        keys = {entry['user'] for entry in entries
+                if entry['user'] is not None}
+        users = {}
+        for key in keys:
+            lookup = ({'pk': key} if isinstance(key, int)
+                      else {'email': key} if '@' in str(key)
+                      else {'username': key})
+            users[key] = User.objects.filter(**lookup).first()
+        return users
+
+    def read_tokens(self, entries, path):
+        """Токены для запросов к серверу: поле token записи
+        или файл --tokens. Локальная база для этого не используется."""
+        tokens = {}
+        if path is not None:
+            try:
+                tokens = {str(user): token for user, token
+                          in json.loads(path.read_text()).items()}
+            except (OSError, ValueError, AttributeError) as error:
+                raise CommandError(f'Не удалось прочитать {path}: {error}')
+        missing = {str(entry['user']) for entry in entries
+                   if entry['user'] is not None and not entry['token']
+                   and str(entry['user']) not in tokens}
+        if missing:
+            self.stderr.write('Нет токенов, запросы пойдут анонимно: '
+                              + ', '.join(sorted(missing)))
+        return tokens
+
+    def setup(self, entries, base_url, rollback, tokens_path):
+        """Возвращает функцию, выполняющую одну запись журнала
+        и возвращающую код ответа."""
+        local = threading.local()
+        if base_url:
+            tokens = self.read_tokens(entries, tokens_path)
+
+            def send(entry):
+                if not hasattr(local, 'session'):
+                    local.session = requests.Session()
+                headers = {}
+                token = entry['token'] or tokens.get(str(entry['user']))
+                if token:
+                    headers['Authorization'] = f'Token {token}'
+                response = local.session.request(
+                    entry['method'], base_url.rstrip('/') + entry['path'],
+                    params=entry['query'], json=entry['body'],
+                    headers=headers)
+                return response.status_code
+            return send
+
+        users = self.resolve_users(entries)
+
+        def send(entry):
+            if not hasattr(local, 'client'):
+                local.client = APIClient()
+            client = local.client
+            client.force_authenticate(users.get(entry['user']))
+            with transaction.atomic():
+                if entry['method'] == 'GET':
+                    response = client.get(entry['path'], entry['query'])
+                else:
+                    path = entry['path']
+                    if entry['query']:
+                        path += '?' + urlencode(entry['query'], doseq=True)
+                    response = client.generic(
+                        entry['method'], path,
+                        json.dumps(entry['body'] or {}),
+                        content_type='application/json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                if rollback:
+                    transaction.set_rollback(True)
+            return response.status_code
+        return send
+
+    @staticmethod
+    def summarize(results, duration):
+        """Сводка по маршрутам: число запросов, перцентили, ошибки."""
+        routes = defaultdict(list)
+        for route, status, elapsed in results:
+            routes[route].append((status, elapsed))
+        summary = {
+            'requests': len(results),
+            'duration': round(duration, 2),
+            'throughput': round(len(results) / duration, 1) if duration else 0,
+            'routes': {},
+        }
+        for route, items in sorted(routes.items()):
+            timings = [elapsed for _, elapsed in items]
+            quantiles = (statistics.quantiles(timings, n=100,
+                                              method='inclusive')
+                         if len(timings) > 1 else timings * 99)
+            summary['routes'][route] = {
+                'count': len(items),
+                'p50': percentile(quantiles, 50),
+                'p95': percentile(quantiles, 95),
+                'p99': percentile(quantiles, 99),
+                'client_errors': sum(
+                    status is not None and 400 <= status < 500
+                    for status, _ in items),
+                'errors': sum(
+                    status is None or status >= 500 for status, _ in items),
+            }
+        return summary
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, path, base_url, tokens, concurrency, repeat,
+               rollback, output, **options):
+        if rollback and base_url:
+            raise CommandError('--rollback работает только внутри процесса')
+        if tokens and not base_url:
+            raise CommandError('--tokens работает только с --base-url')
+        entries, skipped = read_log(path)
+        if not entries:
+            raise CommandError(f'В {path} нет записей для воспроизведения')
+        if skipped:
+            self.stderr.write(f'Пропущено строк: {skipped}')
+        send = self.setup(entries, base_url, rollback, tokens)
+
+        def replay(entry):
+            start = time.perf_counter()
+            try:
+                status = send(entry)
+            except Exception as error:
+                self.stderr.write(f'{entry["method"]} {entry["path"]}: '
+                                  f'{error}')
+                status = None
+            return (f'{entry["method"]} {get_route(entry["path"])}',
+                    status, time.perf_counter() - start)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(replay, entries * repeat))
+            duration = time.perf_counter() - started
+            if not base_url:
+                # Тестовый клиент не закрывает соединения с базой,
+                # а у каждого потока пула они свои. Барьер раздаёт
+                # закрытие всем потокам, по одному разу на поток.
+                barrier = threading.Barrier(concurrency)
+
+                def close_connections(_):
+                    barrier.wait()
+                    connections.close_all()
+                list(pool.map(close_connections, range(concurrency)))
+        summary = self.summarize(results, duration)
+
+        self.stdout.write(
+            f'Запросов: {summary["requests"]} за {summary["duration"]} с, '
+            f'{summary["throughput"]} запросов/с')
+        self.stdout.write(f'{"маршрут":<44}{"кол-во":>8}{"p50":>9}'
+                          f'{"p95":>9}{"p99":>9}{"4xx":>6}{"ошибки":>8}')
+        for route, stats in summary['routes'].items():
+            self.stdout.write(
+                f'{route:<44}{stats["count"]:>8}{stats["p50"]:>9}'
+                f'{stats["p95"]:>9}{stats["p99"]:>9}'
+                f'{stats["client_errors"]:>6}{stats["errors"]:>8}')
+        if output:
+            output.write_text(json.dumps(summary, indent=2,
+                                         ensure_ascii=False))
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает ингредиенты с одинаковыми названием и единицей измерения
+    в ингредиент с наименьшим id перед добавлением ограничения."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(count=models.Count('id')).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).order_by('id').values_list('id', flat=True))
+        keep, others = ids[0], ids[1:]
+        RecipeIngredient.objects.filter(
+            ingredient__in=others).update(ingredient=keep)
+        for item in ShoppingListItem.objects.filter(ingredient__in=others):
+            kept, _ = ShoppingListItem.objects.get_or_create(
+                user_id=item.user_id, ingredient_id=keep)
+            kept.amount += item.amount
+            kept.save()
+            item.delete()
+        Ingredient.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_ingredient_name_pattern_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:56
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+INGREDIENTS_SQL = (
+    "(SELECT {aggregate} FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id)")
+
+
+def create_search_index(apps, schema_editor):
+    """Создаёт GIN-индекс по search_vector в PostgreSQL
+    или таблицу FTS5 в SQLite и заполняет индекс."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        ingredients = INGREDIENTS_SQL.format(
+            aggregate="string_agg(i.name, ' ')")
+        schema_editor.execute(
+            "UPDATE recipes_recipe r SET search_vector = "
+            "setweight(to_tsvector('russian', r.name), 'A') || "
+            "setweight(to_tsvector('russian', "
+            f"coalesce({ingredients}, '')), 'B') || "
+            "setweight(to_tsvector('russian', r.text), 'C')")
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)')
+    elif vendor == 'sqlite':
+        ingredients = INGREDIENTS_SQL.format(
+            aggregate="group_concat(i.name, ' ')")
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_fts '
+            'USING fts5(name, ingredients, text)')
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (rowid, name, ingredients, text) '
+            f"SELECT r.id, r.name, coalesce({ingredients}, ''), r.text "
+            'FROM recipes_recipe r')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX recipe_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
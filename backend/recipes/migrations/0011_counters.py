@@ -0,0 +1,50 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:05
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count(relation_model, relation):
+    return Coalesce(models.Subquery(
+        relation_model.objects.filter(**{relation: models.OuterRef('pk')})
+        .order_by().values(relation).annotate(count=models.Count('pk'))
+        .values('count'),
+        output_field=models.IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    User = apps.get_model('users', 'User')
+    Subscription = apps.get_model('users', 'Subscription')
+    Recipe.objects.update(favorites_count=count(Favorite, 'recipe'),
+                          carts_count=count(ShoppingCart, 'recipe'))
+    User.objects.update(recipes_count=count(Recipe, 'author'),
+                        followers_count=count(Subscription, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_image_variants'),
+        ('users', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в список покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в избранное'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:40
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_name_index(apps, schema_editor):
+    """Создаёт триграммный индекс по lower(name) в PostgreSQL:
+    он обслуживает поиск ингредиентов по вхождению без учёта регистра."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX ingredient_name_trgm_idx ON recipes_ingredient '
+            'USING gin (lower(name) gin_trgm_ops)')
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX ingredient_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='ingredient_name_pattern_idx',
+        ),
+        TrigramExtension(),
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from api.validators import MIN_VALUE_VALIDATOR, MAX_VALUE_VALIDATOR
+from users.models import CounterFieldsMixin
 
 
 User = get_user_model()
@@ -33,12 +35,14 @@ class Ingredient(models.Model):
         verbose_name = 'Игредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [models.UniqueConstraint(
+            fields=('name', 'measurement_unit'), name='unique_ingredient')]
 
     def __str__(self):
         return f'{self.name}:{self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецепта."""
     name = models.CharField('Название', max_length=200)
     text = models.TextField('Описание')
@@ -56,11 +60,25 @@ class Recipe(models.Model):
         validators=(MinValueValidator(MIN_VALUE_VALIDATOR, 'Минимум 1 минута'),
                     MaxValueValidator(MAX_VALUE_VALIDATOR)))
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    search_vector = SearchVectorField('Поисковый индекс', null=True,
+                                      editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлено в избранное', default=0, editable=False)
+    carts_count = models.PositiveIntegerField(
+        'Добавлено в список покупок', default=0, editable=False)
+
+    counter_fields = ('favorites_count', 'carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_favorites_count_idx'),
+        ]
 
     def __str__(self):
         return f'Рецепт: {self.name}. Автор: {self.author}'
@@ -83,6 +101,12 @@ class RecipeIngredient(models.Model):
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
         ordering = ('id',)
+        indexes = [
+            models.Index(fields=('ingredient', 'recipe'),
+                         name='recipe_ingr_ingredient_idx'),
+            models.Index(fields=('recipe', 'ingredient'),
+                         name='recipe_ingr_recipe_idx'),
+        ]
 
     def __str__(self):
         return f"{self.recipe.name} - {self.ingredient.name}"
@@ -126,3 +150,79 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} добавил в список покупок {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается при изменении списка покупок и рецептов в нём."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             verbose_name='Пользователь',
+                             related_name='shopping_list_items')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент',
+                                   related_name='shopping_list_items')
+    amount = models.PositiveIntegerField('Количество', default=0)
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        ordering = ('user',)
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'], name='unique_shopping_list_item')]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} — {self.amount}'
+
+
+class RecipeImageVariant(models.Model):
+    """Уменьшенная копия изображения рецепта."""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='image_variants')
+    name = models.CharField('Вариант', max_length=32)
+    image = models.ImageField('Изображение',
+                              upload_to='recipes/variants')
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+
+    class Meta:
+        verbose_name = 'Вариант изображения'
+        verbose_name_plural = 'Варианты изображений'
+        ordering = ('recipe',)
+        constraints = [models.UniqueConstraint(
+            fields=('recipe', 'name'), name='unique_image_variant')]
+
+    def __str__(self):
+        return f'{self.recipe.name}: {self.name}'
+
+
+class ImageJob(models.Model):
+    """Задача на построение вариантов изображения рецепта.
+    Выполняется командой process_images."""
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='image_jobs')
+    status = models.CharField('Статус', max_length=16, choices=STATUSES,
+                              default=PENDING, db_index=True)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    updated = models.DateTimeField('Обновлена', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.get_status_display()}'
@@ -0,0 +1,91 @@
+import threading
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections, router, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_RESULTS_LIMIT = 1000
+
+_pending = threading.local()
+
+
+def update_search_index(recipe_ids):
+    """Обновляет поисковый индекс рецептов: поле search_vector
+    в PostgreSQL или таблицу FTS5 в SQLite. Индексируются название,
+    названия ингредиентов и описание (в порядке убывания веса)."""
+    recipe_ids = list(recipe_ids)
+    connection = connections[router.db_for_write(Recipe)]
+    ingredients = {}
+    for recipe_id, name in RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids).values_list('recipe', 'ingredient__name'):
+        ingredients.setdefault(recipe_id, []).append(name)
+    if connection.vendor == 'postgresql':
+        for recipe_id in recipe_ids:
+            Recipe.objects.filter(pk=recipe_id).update(search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector(
+                    Value(' '.join(ingredients.get(recipe_id, ()))),
+                    weight='B', config=SEARCH_CONFIG)
+                + SearchVector('text', weight='C', config=SEARCH_CONFIG)))
+    elif connection.vendor == 'sqlite':
+        recipes = Recipe.objects.filter(
+            pk__in=recipe_ids).values_list('id', 'name', 'text')
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                               [(recipe_id,) for recipe_id in recipe_ids])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                'VALUES (%s, %s, %s, %s)',
+                [(recipe_id, name, ' '.join(ingredients.get(recipe_id, ())),
+                  text) for recipe_id, name, text in recipes])
+
+
+def schedule_search_index_update(recipe_id):
+    """Обновляет поисковый индекс рецепта после фиксации транзакции.
+    Все изменения рецепта в одной транзакции (сам рецепт,
+    его ингредиенты) индексируются одним проходом."""
+    if not hasattr(_pending, 'recipe_ids'):
+        _pending.recipe_ids = set()
+    _pending.recipe_ids.add(recipe_id)
+    transaction.on_commit(
+        _flush_search_index, using=router.db_for_write(Recipe))
+
+
+def _flush_search_index():
+    recipe_ids, _pending.recipe_ids = _pending.recipe_ids, set()
+    if recipe_ids:
+        update_search_index(recipe_ids)
+
+
+def search_recipes(queryset, query):
+    """Отбирает рецепты по полнотекстовому запросу и сортирует
+    их по релевантности."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-rank', '-pub_date')
+    if connection.vendor != 'sqlite':
+        return queryset.filter(name__icontains=query)
+    match = ' '.join('"{}"*'.format(term.replace('"', '""'))
+                     for term in query.split())
+    if not match:
+        return queryset
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0) LIMIT %s',
+            [match, FTS_RESULTS_LIMIT])
+        ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)),
+        output_field=IntegerField()))
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from recipes.models import Favorite, Recipe, Tag
+
+User = get_user_model()
+
+
+class RecipeAdminQueriesTest(TestCase):
+    """Число запросов списка рецептов в админке
+    не зависит от числа рецептов на странице."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.authors = [User.objects.create_user(
+            username=f'author{number}', email=f'author{number}@example.com')
+            for number in range(3)]
+        cls.tags = [Tag.objects.create(name=f'Тег {number}',
+                                       color=f'#00000{number}',
+                                       slug=f'tag-{number}')
+                    for number in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_recipes(self, count):
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/images/test.jpg', cooking_time=10,
+                author=self.authors[number % len(self.authors)])
+            recipe.tags.set(self.tags[:number % 3 + 1])
+            Favorite.objects.create(user=self.admin, recipe=recipe)
+
+    def test_changelist_queries(self):
+        # Сессия, администратор, теги для фильтра, COUNT
+        # и страница рецептов вместе с авторами.
+        for count in (2, 10):
+            self.create_recipes(count)
+            with self.subTest(recipes=Recipe.objects.count()):
+                with self.assertNumQueries(5):
+                    response = self.client.get('/admin/recipes/recipe/')
+                self.assertEqual(response.status_code, 200)
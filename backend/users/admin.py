@@ -1,28 +1,40 @@
 from django.contrib import admin
 
 from .models import Subscription, User
+from recipes.admin_filters import AutocompleteFilter, AutocompleteFilterMixin
 
 
 class UserAdmin(admin.ModelAdmin):
     """
     Отображает имя пользователя, email, имя и фамилию в списке.
     Позволяет искать по имени пользователя и email.
-    Позволяет фильтровать по имени пользователя и email.
     """
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
     search_fields = ('username', 'email')
-    list_filter = ('username', 'email')
+    show_full_result_count = False
 
 
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriberFilter(AutocompleteFilter):
+    field_name = 'user'
+
+
+class AuthorFilter(AutocompleteFilter):
+    field_name = 'author'
+
+
+class SubscriptionAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     """
     Отображает пользователя, автора и дату создания в списке.
     Позволяет искать по имени пользователя и автора.
-    Позволяет фильтровать по имени пользователя и автора.
+    Позволяет фильтровать по пользователю и автору (с автодополнением).
     """
     list_display = ('user', 'author', 'created')
+    list_select_related = ('user', 'author')
     search_fields = ('user__username', 'author__username')
-    list_filter = ('user__username', 'author__username')
+    list_filter = (SubscriberFilter, AuthorFilter)
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
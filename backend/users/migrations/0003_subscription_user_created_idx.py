@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20240118_2258'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', '-created', '-id'], name='subscription_user_created_idx'),
+        ),
+    ]
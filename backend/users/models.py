@@ -1,9 +1,46 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import RegexValidator
 from django.db import models
 
+from .signals import users_updated
 
-class User(AbstractUser):
+
+class CounterFieldsMixin:
+    """Счётчики counter_fields меняются выражениями F() в обход модели,
+    поэтому save() существующего объекта без update_fields
+    записывает все поля, кроме них."""
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields]
+        super().save(*args, **kwargs)
+
+
+class UserQuerySet(models.QuerySet):
+    """update() полей, кроме счётчиков, отправляет сигнал
+    users_updated: обновление queryset'ом не вызывает post_save."""
+
+    def update(self, **kwargs):
+        if set(kwargs).issubset(self.model.counter_fields):
+            return super().update(**kwargs)
+        ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        if ids:
+            users_updated.send(sender=self.model, ids=ids)
+        return rows
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с UserQuerySet."""
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Кастомная модель пользователя."""
     username = models.CharField(
         'Username', max_length=150, unique=True,
@@ -11,6 +48,14 @@ class User(AbstractUser):
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
     email = models.EmailField('email', max_length=254, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False)
+
+    counter_fields = ('recipes_count', 'followers_count')
+
+    objects = CustomUserManager()
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -37,6 +82,8 @@ class Subscription(models.Model):
         ordering = ('-author_id',)
         constraints = [models.UniqueConstraint(
             fields=('user', 'author'), name='unique_followers')]
+        indexes = [models.Index(fields=('user', '-created', '-id'),
+                                name='subscription_user_created_idx')]
 
     def __str__(self):
         return f'{self.user} подписался на {self.author}'
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Отправляется после update() пользователей queryset'ом
+# с аргументом ids — id изменённых пользователей.
+users_updated = Signal()
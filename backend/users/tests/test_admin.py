@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from recipes.models import Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class UserAdminQueriesTest(TestCase):
+    """Число запросов списка пользователей в админке
+    не зависит от числа пользователей на странице."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_users(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            user = User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com')
+            Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/images/test.jpg', cooking_time=10,
+                author=user)
+            Subscription.objects.create(user=self.admin, author=user)
+
+    def test_changelist_queries(self):
+        # Сессия, администратор, COUNT и страница пользователей:
+        # счётчики рецептов и подписчиков хранятся в самой таблице.
+        for count in (2, 10):
+            self.create_users(count)
+            with self.subTest(users=User.objects.count()):
+                with self.assertNumQueries(4):
+                    response = self.client.get('/admin/users/user/')
+                self.assertEqual(response.status_code, 200)